@@ -1,4 +1,11 @@
-import boto3
+import asyncio
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from datetime import datetime
+from aiobotocore.config import AioConfig
+from aiobotocore.session import get_session
 from botocore.exceptions import ClientError
 from config import get_settings
 import logging
@@ -6,57 +13,190 @@ import logging
 logger = logging.getLogger(__name__)
 settings = get_settings()
 
+# Presigned URLs are reused while at least this fraction of their lifetime remains
+PRESIGNED_URL_MIN_VALIDITY = 0.9
+PRESIGNED_URL_CACHE_SIZE = 4096
+
+# One session per process: it owns the credential resolver, loaded service
+# models and endpoint data, which every client created from it shares
+_SESSION = get_session()
+
+
+@dataclass(slots=True, frozen=True)
+class S3Meta:
+    """S3 object metadata returned by a HEAD request"""
+    size: int
+    last_modified: datetime
+    content_type: str
+
 
 class S3Client:
     def __init__(self):
-        self.s3_client = boto3.client(
-            's3',
-            aws_access_key_id=settings.aws_access_key_id,
-            aws_secret_access_key=settings.aws_secret_access_key,
-            region_name=settings.aws_region
+        # Size the connection pool to the expected request concurrency so
+        # concurrent GETs reuse keep-alive connections instead of
+        # re-handshaking once the default pool of 10 is exhausted
+        self._config = AioConfig(
+            max_pool_connections=settings.s3_max_pool,
+            retries={'max_attempts': 10, 'mode': 'adaptive'},
+            connect_timeout=3,
+            read_timeout=30,
+            connector_args={'keepalive_timeout': 75}
         )
+        self._session = _SESSION
+        self._client_context = None
+        self._client = None
+        self._client_lock = asyncio.Lock()
+        # Queue excess requests locally rather than opening more sockets
+        # than the pool holds and tripping S3 SlowDown responses
+        self._semaphore = asyncio.Semaphore(settings.s3_max_concurrency)
+        # (bucket, key) -> (etag, body), least recently used first
+        self._cache: OrderedDict = OrderedDict()
+        self._cache_bytes = 0
+        self._cache_max_bytes = settings.s3_cache_max_bytes
+        # (key, expiration) -> (url, expires_at)
+        self._presigned_urls: dict = {}
         self.bucket_name = settings.s3_bucket_name
     
-    async def get_file(self, key: str) -> bytes:
-        """Download file from S3"""
-        try:
-            response = self.s3_client.get_object(
-                Bucket=self.bucket_name,
-                Key=key
+    async def startup(self):
+        """Open the long-lived aiobotocore client (call from app startup)"""
+        async with self._client_lock:
+            if self._client is not None:
+                return
+            self._client_context = self._session.create_client(
+                's3',
+                aws_access_key_id=settings.aws_access_key_id,
+                aws_secret_access_key=settings.aws_secret_access_key,
+                region_name=settings.aws_region,
+                config=self._config
             )
-            return response['Body'].read()
+            self._client = await self._client_context.__aenter__()
+    
+    async def shutdown(self):
+        """Close the aiobotocore client and its connection pool"""
+        async with self._client_lock:
+            if self._client_context is None:
+                return
+            await self._client_context.__aexit__(None, None, None)
+            self._client_context = None
+            self._client = None
+    
+    async def _get_client(self):
+        """Return the shared client, opening it on first use"""
+        if self._client is None:
+            await self.startup()
+        return self._client
+    
+    def _cache_put(self, cache_key: tuple, etag: str, body: bytes):
+        """Store an object body in the LRU, evicting until under budget"""
+        if not etag or len(body) > self._cache_max_bytes:
+            return
+        previous = self._cache.pop(cache_key, None)
+        if previous is not None:
+            self._cache_bytes -= len(previous[1])
+        self._cache[cache_key] = (etag, body)
+        self._cache_bytes += len(body)
+        while self._cache_bytes > self._cache_max_bytes:
+            _, (_, evicted) = self._cache.popitem(last=False)
+            self._cache_bytes -= len(evicted)
+    
+    async def get_file(self, key: str, bucket: str = None) -> bytes:
+        """Download file from S3, revalidating cached copies by ETag"""
+        bucket = bucket or self.bucket_name
+        cache_key = (bucket, key)
+        cached = self._cache.get(cache_key)
+        request = {'Bucket': bucket, 'Key': key}
+        if cached is not None:
+            # Conditional GET: S3 answers 304 without a body when unchanged
+            request['IfNoneMatch'] = cached[0]
+        try:
+            client = await self._get_client()
+            async with self._semaphore:
+                try:
+                    response = await client.get_object(**request)
+                except ClientError as e:
+                    error_code = e.response.get('Error', {}).get('Code')
+                    if cached is not None and error_code in ('304', 'NotModified'):
+                        if cache_key in self._cache:
+                            self._cache.move_to_end(cache_key)
+                        return cached[1]
+                    raise
+                async with response['Body'] as stream:
+                    body = await stream.read()
+            self._cache_put(cache_key, response.get('ETag'), body)
+            return body
         except ClientError as e:
             logger.error(f"Error downloading from S3: {e}")
             raise
     
-    async def get_file_metadata(self, key: str) -> dict:
+    @asynccontextmanager
+    async def get_file_stream(self, key: str, bucket: str = None):
+        """Open an S3 object body for incremental reads without buffering it"""
+        client = await self._get_client()
+        async with self._semaphore:
+            try:
+                response = await client.get_object(
+                    Bucket=bucket or self.bucket_name,
+                    Key=key
+                )
+            except ClientError as e:
+                logger.error(f"Error downloading from S3: {e}")
+                raise
+            async with response['Body'] as stream:
+                yield stream
+    
+    async def get_file_head(self, key: str, num_bytes: int, bucket: str = None) -> bytes:
+        """Read only the first num_bytes of an S3 object"""
+        chunks = []
+        remaining = num_bytes
+        async with self.get_file_stream(key, bucket=bucket) as stream:
+            while remaining > 0:
+                chunk = await stream.read(remaining)
+                if not chunk:
+                    break
+                chunks.append(chunk)
+                remaining -= len(chunk)
+        return b''.join(chunks)
+    
+    async def get_file_metadata(self, key: str) -> S3Meta:
         """Get file metadata without downloading"""
         try:
-            response = self.s3_client.head_object(
-                Bucket=self.bucket_name,
-                Key=key
+            client = await self._get_client()
+            async with self._semaphore:
+                response = await client.head_object(
+                    Bucket=self.bucket_name,
+                    Key=key
+                )
+            return S3Meta(
+                size=response['ContentLength'],
+                last_modified=response['LastModified'],
+                content_type=response.get('ContentType', 'unknown')
             )
-            return {
-                'size': response['ContentLength'],
-                'last_modified': response['LastModified'],
-                'content_type': response.get('ContentType', 'unknown')
-            }
         except ClientError as e:
             logger.error(f"Error getting S3 metadata: {e}")
             raise
     
     async def generate_presigned_url(self, key: str, expiration: int = 3600) -> str:
-        """Generate a presigned URL for S3 object"""
+        """Generate a presigned URL for S3 object, reusing recent signatures"""
+        cache_key = (key, expiration)
+        now = time.monotonic()
+        cached = self._presigned_urls.get(cache_key)
+        if cached is not None and cached[1] - now >= expiration * PRESIGNED_URL_MIN_VALIDITY:
+            return cached[0]
         try:
-            url = self.s3_client.generate_presigned_url(
+            client = await self._get_client()
+            url = await client.generate_presigned_url(
                 'get_object',
                 Params={'Bucket': self.bucket_name, 'Key': key},
                 ExpiresIn=expiration
             )
-            return url
         except ClientError as e:
             logger.error(f"Error generating presigned URL: {e}")
             raise
+        if cache_key not in self._presigned_urls and len(self._presigned_urls) >= PRESIGNED_URL_CACHE_SIZE:
+            # Drop the oldest entry (dicts keep insertion order)
+            del self._presigned_urls[next(iter(self._presigned_urls))]
+        self._presigned_urls[cache_key] = (url, now + expiration)
+        return url
 
 
 # Singleton instance
@@ -8,12 +8,14 @@ This module provides REST endpoints for:
 The chatbot analyzes the CSV dataset and answers natural language questions.
 """
 
+import asyncio
 import logging
 from typing import List
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
 from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
-from app.llm.agent import get_agent
+from chatbot_app.llm.agent import SHAPQAAgent, get_agent
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
@@ -41,12 +43,25 @@ class ChatResponse(BaseModel):
 
 
 
+async def _ready_agent(request: Request) -> SHAPQAAgent:
+    """
+    Return the agent, waiting for the startup preload without blocking
+    the event loop.
+    """
+    future = getattr(request.app.state, "agent_future", None)
+    if future is None:
+        # Router mounted in an app that doesn't preload the agent
+        return await run_in_threadpool(get_agent)
+    # shield: a disconnecting client must not cancel the shared preload
+    return await asyncio.shield(future)
+
+
 # ============================================================================
 # Chat Endpoints
 # ============================================================================
 
 @router.post("/chat", response_model=ChatResponse)
-async def chat(request: ChatRequest) -> ChatResponse:
+async def chat(request: ChatRequest, http_request: Request) -> ChatResponse:
     """
     Chat endpoint for asking questions about the CSV data.
     
@@ -67,13 +82,14 @@ async def chat(request: ChatRequest) -> ChatResponse:
         HTTPException: 500 if error during processing
     """
     try:
-        agent = get_agent()
+        agent = await _ready_agent(http_request)
         
         # Convert Message objects to dict format for agent
         history = [{"role": msg.role, "content": msg.content} for msg in request.chat_history]
         
         # Process through agent (analyzes CSV + LLM)
-        response = agent.process(request.message, history)
+        # Run in a worker thread so concurrent requests reach the model together
+        response = await run_in_threadpool(agent.process, request.message, history)
         
         logger.info(f"Chat: '{request.message}' → {len(response)} chars response")
         return ChatResponse(response=response)
@@ -97,7 +113,9 @@ async def stream(message: str):
     Returns:
         StreamingResponse with SSE-formatted token stream
     """
-    async def event_generator():
+    # Sync generator: StreamingResponse iterates it in a worker thread,
+    # keeping blocking generation off the event loop
+    def event_generator():
         try:
             agent = get_agent()
             
@@ -128,7 +146,7 @@ async def stream(message: str):
 # ============================================================================
 
 @router.get("/health")
-async def health_check():
+async def health_check(request: Request):
     """
     Health check endpoint.
     
@@ -136,13 +154,18 @@ async def health_check():
     - Agent is available
     - At least one data source (JSON or CSV) is loaded
     
-    Returns 200 OK if healthy, 500 if critical components missing.
+    Returns 200 OK if healthy, 503 while the agent is still loading,
+    500 if critical components missing.
     
     Returns:
         dict with status and component health
     """
+    future = getattr(request.app.state, "agent_future", None)
+    if future is not None and not future.done():
+        raise HTTPException(status_code=503, detail="Agent is still loading")
+    
     try:
-        agent = get_agent()
+        agent = await _ready_agent(request)
         
         # Check if JSON data is available
         json_available = False
@@ -1,5 +1,6 @@
 """Application Configuration"""
 import os
+from functools import lru_cache
 from pathlib import Path
 
 # Paths
@@ -7,16 +8,63 @@ PROJECT_ROOT = Path(__file__).parent.parent
 MODEL_DIR = PROJECT_ROOT / "models_cache"
 MODEL_NAME = "Qwen/Qwen2-7B-Instruct"  # or use 2B variant: "Qwen/Qwen2-1.5B-Instruct"
 
-# Auto-detect GPU, prefer CUDA if available (FIX for slowness)
-import torch
-if os.environ.get("DEVICE") == "cpu":
-    DEVICE = "cpu"
-elif torch.cuda.is_available():
-    DEVICE = "cuda"
-else:
-    DEVICE = "cpu"
+# CUDA caching allocator settings are read on the first CUDA allocation, so
+# they are set here, ahead of any model load. Expandable segments grow in place instead of
+# splitting blocks for every new prompt/KV length; large blocks aren't
+# split, and cached blocks are reclaimed before the pool hits 80%.
+os.environ.setdefault(
+    "PYTORCH_CUDA_ALLOC_CONF",
+    "expandable_segments:True,max_split_size_mb:512,garbage_collection_threshold:0.8"
+)
+
+
+@lru_cache(maxsize=None)
+def get_device() -> str:
+    """Auto-detect GPU, prefer CUDA if available (FIX for slowness)"""
+    if os.environ.get("DEVICE") == "cpu":
+        return "cpu"
+    # Imported here so loading config does not pull in torch
+    import torch
+    return "cuda" if torch.cuda.is_available() else "cpu"
+
+
+def __getattr__(name: str):
+    """Resolve DEVICE lazily on first access"""
+    if name == "DEVICE":
+        return get_device()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+# Generation backend: "hf" (transformers generate) or "vllm" (continuous batching, requires vllm)
+LLM_BACKEND = os.environ.get("LLM_BACKEND", "hf").lower()
+
+# vLLM paged KV cache: tokens per KV block and fraction of GPU memory the engine may claim
+VLLM_BLOCK_SIZE = int(os.environ.get("VLLM_BLOCK_SIZE", 16))
+VLLM_GPU_MEMORY_UTILIZATION = float(os.environ.get("VLLM_GPU_MEMORY_UTILIZATION", 0.9))
+# vLLM weight quantization, e.g. "awq" (needs an AWQ checkpoint) or "fp8"; unset = bf16 weights
+VLLM_QUANTIZATION = os.environ.get("VLLM_QUANTIZATION") or None
+
+# Weight quantization on CUDA: "nf4" (4-bit bitsandbytes), "int8" (8-bit bitsandbytes,
+# Ampere+), "fp8" (weight-only float8 via torchao, Ada/Hopper+) or "none" (fp16/bf16)
+QUANT = os.environ.get("QUANT", "nf4").lower()
+
+# Requests generating at once; the HF backend queues generate() calls beyond
+# this (vLLM batches them itself)
+MAX_CONCURRENT_REQUESTS = int(os.environ.get("MAX_CONCURRENT_REQUESTS", 1))
+# INT8 matmuls only beat fp16 once the activation side has more than this many
+# rows. HF generate() decodes each request on its own (one row per step), so
+# QUANT=int8 always falls back to fp16/bf16 there.
+INT8_MIN_ROWS = 16
+
+# Pin the model to one GPU index (e.g. one uvicorn worker per GPU, each started
+# with its own MODEL_GPU); unset = shard across all visible GPUs
+MODEL_GPU = os.environ.get("MODEL_GPU")
+
+# Compile the model forward with torch.compile on CUDA (slower startup, faster decode)
+TORCH_COMPILE = os.environ.get("TORCH_COMPILE", "false").lower() == "true"
 
 # Model Config - optimized for detailed responses without clipping
+MAX_INPUT_TOKENS = 1024  # Prompt context window
 MAX_NEW_TOKENS = 512  # Increased to prevent response clipping
 TEMPERATURE = 0.7
 TOP_P = 0.9
@@ -26,12 +74,26 @@ REPETITION_PENALTY = 1.05
 HOST = os.environ.get("HOST", "0.0.0.0")
 PORT = int(os.environ.get("PORT", 8002))
 DEBUG = os.environ.get("DEBUG", "false").lower() == "true"
+# Comma-separated browser origins allowed by CORS (the UI served from /static is same-origin)
+ALLOWED_ORIGINS = [
+    origin.strip()
+    for origin in os.environ.get("ALLOWED_ORIGINS", "http://localhost:3000").split(",")
+    if origin.strip()
+]
 
 # Data Sources - SHAP CSV from latest session
 # The chatbot automatically finds the latest session folder and reads shap_analysis.csv
 # Sessions are stored in: ../sessions/{session_id}/shap_analysis.csv
 SESSIONS_PATH = PROJECT_ROOT.parent / "sessions"
 
+# Legacy analyzers (CSVAnalyzer / JSONAnalyzer) - overridable per deployment
+FL_DATA_CSV_PATH = os.environ.get("FL_DATA_CSV_PATH", str(SESSIONS_PATH / "shap_analysis.csv"))
+FL_DATA_S3_PATH = os.environ.get("FL_DATA_S3_PATH")  # e.g. "s3://bucket-name/path/to/round.json"
+FL_DATA_LOCAL_PATH = os.environ.get(
+    "FL_DATA_LOCAL_PATH",
+    str(Path(__file__).parent / "data" / "round_002_shap(5).json")
+)
+
 # S3 Configuration (optional)
 AWS_ACCESS_KEY_ID = os.environ.get("AWS_ACCESS_KEY_ID")
 AWS_SECRET_ACCESS_KEY = os.environ.get("AWS_SECRET_ACCESS_KEY")
@@ -15,15 +15,74 @@ Features:
 - Converts to natural language for LLM context
 """
 
+import functools
 import logging
 import re
+import threading
+import textwrap
 from pathlib import Path
-from typing import List, Dict, Optional
+from typing import List, Dict, Optional, Tuple
 from chatbot_app.llm.chat_chain import FastChatChain, get_chat_chain
 from chatbot_app.llm.shap_csv_analyzer import get_shap_csv_analyzer
 
 logger = logging.getLogger(__name__)
 
+# Matches "client 0", "client_0", "client0"
+_CLIENT_RE = re.compile(r'client\s*[_\s]?(\d+)', re.IGNORECASE)
+
+# System prompts, built once at import so every request sends byte-identical
+# prefixes (and the chat chain's prefix KV cache keyed on them keeps hitting)
+_SYS_FL_PROMPT = textwrap.dedent("""
+    You are a helpful assistant answering questions about a federated learning poisoning detection system.
+    You have access to client model update statistics and SHAP feature analysis showing which features are most important for detecting client behavior.
+
+    When discussing SHAP features:
+    - Explain what each top feature represents and why it's important for detection
+    - Use simple terms that non-technical people can understand
+    - Describe what the feature values mean (high/low, positive/negative, etc.)
+    - Explain how each feature contributes to the detection decision
+    - Compare clients when asked about multiple ones
+
+    Be clear, accurate, and help users understand client behavior through the provided SHAP analysis.
+""").strip()
+
+_SYS_GENERAL_PROMPT = textwrap.dedent("""
+    You are a helpful, friendly assistant.
+    Answer questions accurately and honestly.
+    Be clear and concise.
+""").strip()
+
+_SYS_FL_STREAM_PROMPT = textwrap.dedent("""
+    You are a helpful assistant for a federated learning poisoning detection system.
+    You have access to client model update statistics and feature contribution data.
+    Use the data to answer questions about client behavior.
+    Do not invent new questions. Be honest if you don't know something.
+""").strip()
+
+_SYS_GENERAL_STREAM_PROMPT = textwrap.dedent("""
+    You are a helpful, friendly assistant.
+    Only answer questions related to the federated learning poisoning detection system.
+    Do not answer questions outside this domain. If a question is outside this domain, respond with a polite pre-set message such as:
+    "I'm sorry, I can only answer questions about the federated learning poisoning detection system."
+    Be honest if you don't know something.
+""").strip()
+
+# Instruction tails appended after the SHAP context, rendered once at import.
+# Kept free of source indentation so it doesn't inflate the prompt token count.
+_FL_INSTRUCTIONS = (
+    "Based on the SHAP analysis above, explain the client's behavior "
+    "and what the top features reveal about them."
+)
+
+_FL_STREAM_INSTRUCTIONS = textwrap.dedent("""
+    - If the question asks why a client is malicious or benign,
+        - Write a short, simple explanation for someone without technical or machine learning experience.
+        - Use SHAP values to find most important features, But do not mention SHAP directly.
+        - Only mention the most important features with the raw values.
+        - Focus on what makes this class different and what would help someone spot it.
+    - Otherwise, answer directly from the dataset without adding unnecessary explanations.
+""").strip()
+
 
 class SHAPQAAgent:
     """
@@ -45,11 +104,21 @@ class SHAPQAAgent:
             self.analyzer = get_shap_csv_analyzer()
             logger.info("✓ SHAP CSV analyzer initialized")
         except Exception as e:
-            logger.error(f"Failed to initialize SHAP analyzer: {e}")
+            logger.error("Failed to initialize SHAP analyzer: %s", e)
             logger.warning("Agent will not provide SHAP context without CSV data")
         
+        # The agent keeps the analyzer it was built with and its loaded CSV is
+        # immutable, so SHAP context and question classification are pure
+        # functions of their inputs (the caches live and die with the agent)
+        self._cached_shap_context = functools.lru_cache(maxsize=256)(self._build_shap_context)
+        self._is_fl_question = functools.lru_cache(maxsize=1024)(self._classify_question)
+        
         logger.info("✓ SHAP Q&A Agent initialized")
     
+    def _classify_question(self, user_input: str) -> bool:
+        """Check whether the question is about the FL system"""
+        return bool(self.analyzer and self.analyzer._is_fl_system_question(user_input))
+    
     def _extract_client_ids(self, question: str) -> List[int]:
         """
         Extract client IDs from question.
@@ -64,14 +133,41 @@ class SHAPQAAgent:
         Returns:
             List of client IDs, or empty list
         """
-        pattern = r'client\s*[_\s]?(\d+)'
-        matches = re.findall(pattern, question, re.IGNORECASE)
-        
-        client_ids = [int(m) for m in matches]
+        client_ids = [int(m) for m in _CLIENT_RE.findall(question)]
         if client_ids:
-            logger.info(f"Extracted client IDs from question: {client_ids}")
+            logger.info("Extracted client IDs from question: %s", client_ids)
         return client_ids
     
+    def _build_shap_context(self, client_ids: Tuple[int, ...]) -> Optional[str]:
+        """
+        Build SHAP feature context for a tuple of client IDs.
+        
+        Args:
+            client_ids: Tuple of client IDs
+        
+        Returns:
+            Natural language context with top 5 SHAP features
+        """
+        contexts = []
+        
+        for client_id in client_ids:
+            # Get top 5 SHAP features for this client from CSV
+            shap_context = self.analyzer.get_top_shap_features_for_client(
+                client_id=client_id,
+                top_n=5
+            )
+            
+            if shap_context:
+                contexts.append(shap_context)
+                logger.info("✓ Got SHAP context for client %d", client_id)
+            else:
+                logger.warning("⚠️  Could not get SHAP context for client %d", client_id)
+        
+        if contexts:
+            return "\n\n".join(contexts)
+        
+        return None
+    
     def _get_shap_context_for_clients(self, client_ids: List[int]) -> Optional[str]:
         """
         Get SHAP feature context for mentioned clients.
@@ -86,28 +182,9 @@ class SHAPQAAgent:
             return None
         
         try:
-            contexts = []
-            
-            for client_id in client_ids:
-                # Get top 5 SHAP features for this client from CSV
-                shap_context = self.analyzer.get_top_shap_features_for_client(
-                    client_id=client_id,
-                    top_n=5
-                )
-                
-                if shap_context:
-                    contexts.append(shap_context)
-                    logger.info(f"✓ Got SHAP context for client {client_id}")
-                else:
-                    logger.warning(f"⚠️  Could not get SHAP context for client {client_id}")
-            
-            if contexts:
-                return "\n\n".join(contexts)
-            
-            return None
-            
+            return self._cached_shap_context(tuple(client_ids))
         except Exception as e:
-            logger.error(f"Error getting SHAP context: {e}", exc_info=True)
+            logger.error("Error getting SHAP context: %s", e, exc_info=True)
             return None
     
     def process(self, user_input: str, chat_history: List[Dict[str, str]]) -> str:
@@ -121,7 +198,7 @@ class SHAPQAAgent:
         Returns:
             Natural language answer
         """
-        logger.info(f"Processing: {user_input}")
+        logger.info("Processing: %s", user_input)
         
         try:
             # Check if question mentions specific clients
@@ -129,45 +206,26 @@ class SHAPQAAgent:
             shap_context = None
             
             if client_ids and self.analyzer:
-                logger.info(f"Client IDs detected: {client_ids}, fetching SHAP context...")
+                logger.info("Client IDs detected: %s, fetching SHAP context...", client_ids)
                 shap_context = self._get_shap_context_for_clients(client_ids)
             
             # Determine if this is FL-specific question
-            is_fl_question = self.analyzer and self.analyzer._is_fl_system_question(user_input)
+            is_fl_question = self._is_fl_question(user_input)
             
             if is_fl_question and self.analyzer:
-                logger.info(f"FL-specific question detected")
+                logger.info("FL-specific question detected")
                 
-                # System prompt for FL-specific questions
-                system_prompt = """You are a helpful assistant answering questions about a federated learning poisoning detection system.
-You have access to client model update statistics and SHAP feature analysis showing which features are most important for detecting client behavior.
-
-When discussing SHAP features:
-- Explain what each top feature represents and why it's important for detection
-- Use simple terms that non-technical people can understand
-- Describe what the feature values mean (high/low, positive/negative, etc.)
-- Explain how each feature contributes to the detection decision
-- Compare clients when asked about multiple ones
-
-Be clear, accurate, and help users understand client behavior through the provided SHAP analysis."""
+                system_prompt = _SYS_FL_PROMPT
                 
                 # Use SHAP context if available, otherwise general context
                 if shap_context:
-                    user_content = f"""SHAP Feature Analysis:
-{shap_context}
-
-Question: {user_input}
-
-Based on the SHAP analysis above, explain the client's behavior and what the top features reveal about them."""
+                    user_content = f"SHAP Feature Analysis:\n{shap_context}\n\nQuestion: {user_input}\n\n{_FL_INSTRUCTIONS}"
                 else:
                     user_content = user_input
             else:
-                logger.info(f"General knowledge question or no analyzer")
+                logger.info("General knowledge question or no analyzer")
                 
-                # System prompt for general questions
-                system_prompt = """You are a helpful, friendly assistant.
-Answer questions accurately and honestly.
-Be clear and concise."""
+                system_prompt = _SYS_GENERAL_PROMPT
                 
                 user_content = user_input
             
@@ -177,21 +235,22 @@ Be clear and concise."""
                 {"role": "user", "content": user_content}
             ]
             
-            logger.info("====== LLM INPUT START ======")
-            logger.info(f"System: {system_prompt[:100]}...")
-            if shap_context:
-                logger.info(f"SHAP Context length: {len(shap_context)} chars")
-            logger.info(f"User: {user_input}")
-            logger.info("====== LLM INPUT END ======")
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("====== LLM INPUT START ======")
+                logger.debug("System: %s...", system_prompt[:100])
+                if shap_context:
+                    logger.debug("SHAP Context length: %d chars", len(shap_context))
+                logger.debug("User: %s", user_input)
+                logger.debug("====== LLM INPUT END ======")
             
             # Generate response
             response = self.chat_chain.chat(user_input, messages)
             
-            logger.info(f"Response generated: {len(response)} chars")
+            logger.info("Response generated: %d chars", len(response))
             return response
             
         except Exception as e:
-            logger.error(f"Error in process: {e}", exc_info=True)
+            logger.error("Error in process: %s", e, exc_info=True)
             return f"I encountered an error: {str(e)}"
     
     def stream_process(self, user_input: str, chat_history: List[Dict[str, str]]):
@@ -205,7 +264,7 @@ Be clear and concise."""
         Yields:
             Response tokens
         """
-        logger.info(f"Stream processing: {user_input}")
+        logger.info("Stream processing: %s", user_input)
         
         try:
             # Check if question mentions specific clients
@@ -213,42 +272,25 @@ Be clear and concise."""
             shap_context = None
             
             if client_ids and self.analyzer:
-                logger.info(f"Client IDs detected: {client_ids}, fetching SHAP context...")
+                logger.info("Client IDs detected: %s, fetching SHAP context...", client_ids)
                 shap_context = self._get_shap_context_for_clients(client_ids)
             
             # Determine if this is FL-specific question
-            is_fl_question = self.analyzer and self.analyzer._is_fl_system_question(user_input)
+            is_fl_question = self._is_fl_question(user_input)
             
             if is_fl_question and self.analyzer:
-                logger.info(f"FL-specific question detected")
+                logger.info("FL-specific question detected")
                 
-                system_prompt = """You are a helpful assistant for a federated learning poisoning detection system.
-                You have access to client model update statistics and feature contribution data.
-                Use the data to answer questions about client behavior.
-                Do not invent new questions. Be honest if you don't know something."""
+                system_prompt = _SYS_FL_STREAM_PROMPT
                 
                 if shap_context:
-                    user_content = f"""SHAP Feature Analysis:
-{shap_context}
-
-Question: {user_input}
-
-                - If the question asks why a client is malicious or benign, 
-                    - Write a short, simple explanation for someone without technical or machine learning experience.
-                    - Use SHAP values to find most important features, But do not mention SHAP directly.
-                    - Only mention the most important features with the raw values.
-                    - Focus on what makes this class different and what would help someone spot it.
-                - Otherwise, answer directly from the dataset without adding unnecessary explanations.
-                """
-
+                    user_content = f"SHAP Feature Analysis:\n{shap_context}\n\nQuestion: {user_input}\n\n{_FL_STREAM_INSTRUCTIONS}"
+                else:
+                    user_content = user_input
             else:
-                logger.info(f"General knowledge question or no analyzer")
+                logger.info("General knowledge question or no analyzer")
                 
-                system_prompt = """You are a helpful, friendly assistant.
-                Only answer questions related to the federated learning poisoning detection system.
-                Do not answer questions outside this domain. If a question is outside this domain, respond with a polite pre-set message such as: 
-                "I'm sorry, I can only answer questions about the federated learning poisoning detection system." 
-                Be honest if you don't know something."""
+                system_prompt = _SYS_GENERAL_STREAM_PROMPT
 
                 user_content = user_input
             
@@ -258,29 +300,33 @@ Question: {user_input}
                 {"role": "user", "content": user_content}
             ]
             
-            logger.info("====== LLM STREAM INPUT START ======")
-            logger.info(f"System: {system_prompt[:100]}...")
-            if shap_context:
-                logger.info(f"SHAP Context length: {len(shap_context)} chars")
-            logger.info(f"User: {user_input}")
-            logger.info("====== LLM STREAM INPUT END ======")
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("====== LLM STREAM INPUT START ======")
+                logger.debug("System: %s...", system_prompt[:100])
+                if shap_context:
+                    logger.debug("SHAP Context length: %d chars", len(shap_context))
+                logger.debug("User: %s", user_input)
+                logger.debug("====== LLM STREAM INPUT END ======")
             
             # Stream response
             for token in self.chat_chain.stream_chat(user_input, messages):
                 yield token
                 
         except Exception as e:
-            logger.error(f"Error in stream_process: {e}", exc_info=True)
+            logger.error("Error in stream_process: %s", e, exc_info=True)
             yield f"Error: {str(e)}"
 
 
 # Global instance
 _agent: Optional[SHAPQAAgent] = None
+_agent_lock = threading.Lock()
 
 
 def get_agent() -> SHAPQAAgent:
     """Get or initialize the SHAP Q&A agent"""
     global _agent
     if _agent is None:
-        _agent = SHAPQAAgent()
+        with _agent_lock:
+            if _agent is None:
+                _agent = SHAPQAAgent()
     return _agent
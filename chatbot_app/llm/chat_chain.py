@@ -1,14 +1,35 @@
 """Fast LLM Chat Chain with SHAP Explainability"""
+import copy
 import logging
 import json
-from typing import Iterator, Optional, Dict, Any
+import threading
+from collections import OrderedDict
+from typing import Iterator, Optional, Dict, Any, Tuple
 import torch
+from transformers import TextIteratorStreamer
 
 from chatbot_app.models.qwen_loader import QwenModelLoader
-from chatbot_app.config import MAX_NEW_TOKENS, TEMPERATURE, TOP_P, REPETITION_PENALTY, DEVICE
+from chatbot_app.models.vllm_engine import VLLMEngine
+from chatbot_app.config import (
+    MAX_INPUT_TOKENS, MAX_NEW_TOKENS, TEMPERATURE, TOP_P, REPETITION_PENALTY, DEVICE, LLM_BACKEND,
+    MAX_CONCURRENT_REQUESTS
+)
 
 logger = logging.getLogger(__name__)
 
+# Number of distinct system prompts whose prefilled KV cache is kept
+PREFIX_CACHE_SIZE = 8
+
+# Seconds to wait for the next streamed chunk before giving up
+STREAM_TOKEN_TIMEOUT = 60.0
+
+
+def _to_device(tensor: torch.Tensor) -> torch.Tensor:
+    """Copy a CPU tensor to DEVICE, asynchronously from pinned memory on CUDA"""
+    if DEVICE == "cuda":
+        return tensor.pin_memory().to(DEVICE, non_blocking=True)
+    return tensor.to(DEVICE)
+
 
 class FastChatChain:
     """
@@ -18,7 +39,27 @@ class FastChatChain:
     
     def __init__(self):
         """Initialize the chat chain with model"""
-        self.model_loader = QwenModelLoader()
+        self.engine: Optional[VLLMEngine] = None
+        self.model_loader: Optional[QwenModelLoader] = None
+        if LLM_BACKEND == "vllm":
+            self.engine = VLLMEngine()
+        else:
+            self.model_loader = QwenModelLoader()
+        # System prompt text -> (prefix input_ids, prefilled past_key_values)
+        self._prefix_cache: "OrderedDict[str, Tuple[torch.Tensor, Any]]" = OrderedDict()
+        # HF generate() isn't batched: each concurrent call holds its own KV
+        # cache on the shared model, so at most MAX_CONCURRENT_REQUESTS run at
+        # once. Compiled decode reuses one static cache stored on the model and
+        # CUDA graph replay isn't thread-safe, so it runs one call at a time.
+        self._generate_slots = None
+        if self.model_loader:
+            self._generate_slots = (
+                threading.Lock() if self.model_loader.static_cache
+                else threading.BoundedSemaphore(MAX_CONCURRENT_REQUESTS)
+            )
+        # Requests run on threadpool and streaming threads; held over the
+        # prefill too, so two requests never prefill the same prefix
+        self._prefix_lock = threading.Lock()
         logger.info("Chat chain initialized successfully")
     
     def _build_prompt(
@@ -26,73 +67,169 @@ class FastChatChain:
         user_input: str,
         chat_history: Optional[list] = None,
         system_prompt: Optional[str] = None
-    ) -> str:
+    ) -> Tuple[str, str]:
         """
         Build the prompt efficiently.
         
+        The system prompt is returned separately so its prefill can be
+        cached and reused across turns.
+        
         Args:
             user_input: Current user message
             chat_history: List of previous messages
             system_prompt: Custom system prompt
         
         Returns:
-            Complete prompt string
+            Tuple of (system prefix, turn suffix); their concatenation is
+            the complete prompt
         """
         if chat_history is None:
             chat_history = []
         
+        # Agents send their system prompt as a leading "system" message
+        turns = []
+        for msg in chat_history:
+            if msg.get("role") == "system":
+                if system_prompt is None:
+                    system_prompt = msg.get("content", "").strip()
+            else:
+                turns.append(msg)
+        
         if system_prompt is None:
             system_prompt = """You are a helpful and accurate AI assistant. 
 Answer questions clearly and concisely based on the information provided."""
         
-        # Build conversation history (minimal overhead)
-        history_parts = [system_prompt]
+        # Build conversation history (minimal overhead), last 5 messages for speed
+        history = "".join(
+            f"{'User' if msg.get('role') == 'user' else 'Assistant'}: {content}\n"
+            for msg in turns[-5:]
+            if (content := msg.get("content", "").strip())
+        )
+        
+        return f"{system_prompt}\n", f"{history}User: {user_input}\nAssistant:"
+    
+    def _get_prefix_entry(self, prefix: str) -> Tuple[torch.Tensor, Any]:
+        """
+        Return the cached token ids and prefilled KV cache for a prompt prefix.
         
-        for msg in chat_history[-5:]:  # Limit to last 5 messages for speed
-            role = "User" if msg.get("role") == "user" else "Assistant"
-            content = msg.get("content", "").strip()
-            if content:
-                history_parts.append(f"{role}: {content}")
+        The prefix is tokenized and run through the model once, so later
+        turns with the same system prompt only tokenize and prefill the
+        new suffix.
         
-        # Add current input
-        history_parts.append(f"User: {user_input}")
-        history_parts.append("Assistant:")
+        Args:
+            prefix: System prompt prefix text
         
-        return "\n".join(history_parts)
+        Returns:
+            Tuple of (prefix input_ids, past_key_values)
+        """
+        with self._prefix_lock:
+            entry = self._prefix_cache.get(prefix)
+            if entry is not None:
+                self._prefix_cache.move_to_end(prefix)
+                return entry
+            
+            prefix_ids = self.model_loader.tokenizer(
+                prefix,
+                return_tensors="pt"
+            )["input_ids"].to(DEVICE)
+            with torch.inference_mode():
+                past_key_values = self.model_loader.model(
+                    input_ids=prefix_ids,
+                    use_cache=True
+                ).past_key_values
+            entry = (prefix_ids, past_key_values)
+            self._prefix_cache[prefix] = entry
+            if len(self._prefix_cache) > PREFIX_CACHE_SIZE:
+                self._prefix_cache.popitem(last=False)
+            return entry
     
-    def _generate_response(self, prompt: str) -> str:
+    def _prepare_inputs(self, prefix: str, suffix: str) -> Tuple[Dict[str, torch.Tensor], Any]:
         """
-        Generate response efficiently with minimal tokenization overhead.
+        Tokenize only the turn suffix and append it to the cached prefix ids.
         
         Args:
-            prompt: Input prompt
+            prefix: System prompt prefix text
+            suffix: Conversation turns following the prefix
         
         Returns:
-            Generated response text
+            Tuple of (generate inputs, private copy of the prefix KV cache)
         """
-        try:
-            # Single tokenization pass
+        if self.model_loader.static_cache:
+            # Compiled decode preallocates its own static KV cache, which a
+            # reused dynamic prefix cache can't be spliced into
+            max_suffix_tokens = 0
+        else:
+            prefix_ids, past_key_values = self._get_prefix_entry(prefix)
+            max_suffix_tokens = MAX_INPUT_TOKENS - prefix_ids.shape[-1]
+        
+        if max_suffix_tokens <= 0:
+            # Static cache, or the system prompt alone fills the window:
+            # tokenize the whole prompt with plain truncation
             inputs = self.model_loader.tokenizer(
-                prompt,
+                prefix + suffix,
                 return_tensors="pt",
                 truncation=True,
-                max_length=1024  # Input context window
-            ).to(DEVICE)
+                max_length=MAX_INPUT_TOKENS
+            )
+            return {k: _to_device(v) for k, v in inputs.items()}, None
+        
+        suffix_ids = _to_device(self.model_loader.tokenizer(
+            suffix,
+            return_tensors="pt",
+            add_special_tokens=False
+        )["input_ids"])
+        # Keep the most recent turns (and the trailing "Assistant:") when truncating
+        suffix_ids = suffix_ids[:, -max_suffix_tokens:]
+        
+        input_ids = torch.cat([prefix_ids, suffix_ids], dim=-1)
+        inputs = {"input_ids": input_ids, "attention_mask": torch.ones_like(input_ids)}
+        
+        # generate() extends the cache in place, so each call gets its own copy
+        # (cloning also turns the cached inference tensors into normal ones)
+        return inputs, copy.deepcopy(past_key_values)
+    
+    def _generate(self, **kwargs):
+        """Run model.generate() once a generation slot is free"""
+        self._generate_slots.acquire()
+        return self._generate_in_slot(**kwargs)
+    
+    def _generate_in_slot(self, **kwargs):
+        """Run model.generate() under inference_mode (thread-local, so the streaming thread enters it here), then free the held slot"""
+        try:
+            with torch.inference_mode():
+                return self.model_loader.model.generate(**kwargs)
+        finally:
+            self._generate_slots.release()
+    
+    def _generate_response(self, prefix: str, suffix: str) -> str:
+        """
+        Generate response efficiently with minimal tokenization overhead.
+        
+        Args:
+            prefix: System prompt prefix (prefill is cached)
+            suffix: Conversation turns following the prefix
+        
+        Returns:
+            Generated response text
+        """
+        try:
+            # Tokenize only the new turns; the system prompt ids are cached
+            inputs, past_key_values = self._prepare_inputs(prefix, suffix)
             
             # Fast generation with GPU optimizations
-            with torch.no_grad():
-                output = self.model_loader.model.generate(
-                    **inputs,
-                    max_new_tokens=MAX_NEW_TOKENS,  # Use config value (512)
-                    temperature=TEMPERATURE,
-                    top_p=TOP_P,
-                    repetition_penalty=REPETITION_PENALTY,
-                    do_sample=True,
-                    pad_token_id=self.model_loader.tokenizer.eos_token_id,
-                    eos_token_id=self.model_loader.tokenizer.eos_token_id,
-                    use_cache=True,  # Enable KV cache (GPU optimization)
-                    num_beams=1  # Greedy decoding (faster)
-                )
+            output = self._generate(
+                **inputs,
+                past_key_values=past_key_values,
+                max_new_tokens=MAX_NEW_TOKENS,  # Use config value (512)
+                temperature=TEMPERATURE,
+                top_p=TOP_P,
+                repetition_penalty=REPETITION_PENALTY,
+                do_sample=True,
+                pad_token_id=self.model_loader.tokenizer.eos_token_id,
+                eos_token_id=self.model_loader.tokenizer.eos_token_id,
+                use_cache=True,  # Enable KV cache (GPU optimization)
+                num_beams=1  # Greedy decoding (faster)
+            )
             
             # Efficient decoding
             generated_ids = output[0][inputs["input_ids"].shape[-1]:]
@@ -119,8 +256,11 @@ Answer questions clearly and concisely based on the information provided."""
             LLM response
         """
         try:
-            prompt = self._build_prompt(user_input, chat_history)
-            response = self._generate_response(prompt)
+            prefix, suffix = self._build_prompt(user_input, chat_history)
+            if self.engine:
+                response = self.engine.generate(prefix + suffix).strip()
+                return response if response else "I couldn't generate a response. Please try again."
+            response = self._generate_response(prefix, suffix)
             return response
         except Exception as e:
             logger.error(f"Chat error: {str(e)}")
@@ -138,36 +278,51 @@ Answer questions clearly and concisely based on the information provided."""
             Response tokens
         """
         try:
-            prompt = self._build_prompt(user_input, chat_history)
+            prefix, suffix = self._build_prompt(user_input, chat_history)
             
-            inputs = self.model_loader.tokenizer(
-                prompt,
-                return_tensors="pt",
-                truncation=True,
-                max_length=1024
-            ).to(DEVICE)
+            if self.engine:
+                yield from self.engine.stream(prefix + suffix)
+                return
             
-            with torch.no_grad():
-                output = self.model_loader.model.generate(
-                    **inputs,
-                    max_new_tokens=MAX_NEW_TOKENS,  # Use config value (512)
-                    temperature=TEMPERATURE,
-                    top_p=TOP_P,
-                    repetition_penalty=REPETITION_PENALTY,
-                    do_sample=True,
-                    pad_token_id=self.model_loader.tokenizer.eos_token_id,
-                    eos_token_id=self.model_loader.tokenizer.eos_token_id
-                )
+            inputs, past_key_values = self._prepare_inputs(prefix, suffix)
             
-            generated_ids = output[0][inputs["input_ids"].shape[-1]:]
-            response = self.model_loader.tokenizer.decode(
-                generated_ids,
-                skip_special_tokens=True
+            # generate() runs in a worker thread and pushes decoded text into
+            # the streamer, so chunks are yielded as tokens are produced
+            streamer = TextIteratorStreamer(
+                self.model_loader.tokenizer,
+                skip_prompt=True,
+                skip_special_tokens=True,
+                timeout=STREAM_TOKEN_TIMEOUT  # Don't hang if generate() dies in the thread
+            )
+            # Wait for a slot here rather than in the thread, so time spent
+            # queued doesn't count against the streamer's token timeout
+            self._generate_slots.acquire()
+            generation = threading.Thread(
+                target=self._generate_in_slot,
+                kwargs={
+                    **inputs,
+                    "past_key_values": past_key_values,
+                    "streamer": streamer,
+                    "max_new_tokens": MAX_NEW_TOKENS,
+                    "temperature": TEMPERATURE,
+                    "top_p": TOP_P,
+                    "repetition_penalty": REPETITION_PENALTY,
+                    "do_sample": True,
+                    "pad_token_id": self.model_loader.tokenizer.eos_token_id,
+                    "eos_token_id": self.model_loader.tokenizer.eos_token_id
+                },
+                daemon=True
             )
+            try:
+                generation.start()
+            except Exception:
+                self._generate_slots.release()
+                raise
             
-            # Stream character by character
-            for char in response:
-                yield char
+            for chunk in streamer:
+                if chunk:
+                    yield chunk
+            generation.join()
         
         except Exception as e:
             logger.error(f"Stream chat error: {str(e)}")
@@ -175,11 +330,15 @@ Answer questions clearly and concisely based on the information provided."""
     
 # Global instance
 _chat_chain: Optional[FastChatChain] = None
+_chat_chain_lock = threading.Lock()
 
 
 def get_chat_chain() -> FastChatChain:
     """Get or create the chat chain instance (singleton)"""
     global _chat_chain
     if _chat_chain is None:
-        _chat_chain = FastChatChain()
+        # Concurrent first requests must not load the model twice
+        with _chat_chain_lock:
+            if _chat_chain is None:
+                _chat_chain = FastChatChain()
     return _chat_chain
@@ -12,11 +12,83 @@ import logging
 import pandas as pd
 import numpy as np
 import re
+import threading
 from pathlib import Path
-from typing import Optional, Tuple
+from typing import Any, Dict, List, Optional, Tuple
+
+try:
+    import pyarrow.csv as pacsv
+    HAS_PYARROW = True
+except ImportError:
+    HAS_PYARROW = False
 
 logger = logging.getLogger(__name__)
 
+# Bytes per parse block handed to each pyarrow worker thread
+CSV_BLOCK_SIZE = 16 << 20
+
+FL_KEYWORDS = (
+    'client', 'malicious', 'benign', 'detection', 'round', 'confidence',
+    'prediction', 'poisoned', 'attack', 'csv', 'data', 'statistics',
+    'federated', 'learning', 'parameter', 'model', 'update', 'suspicious',
+    'accuracy', 'performance', 'anomal', 'detection rate'
+)
+
+# One case-insensitive alternation scanned in C, instead of a Python
+# substring check per keyword
+_FL_KEYWORD_RE = re.compile("|".join(map(re.escape, FL_KEYWORDS)), re.IGNORECASE)
+
+# (column, label) pairs rendered into each row description, in order
+STATS_SPEC = (
+    ("param_mean", "mean value of"),
+    ("param_std", "standard deviation of"),
+    ("param_min", "minimum of"),
+    ("param_max", "maximum of"),
+    ("param_median", "median of"),
+    ("param_range", "value range of"),
+    ("param_abs_mean", "absolute mean of"),
+    ("param_skew", "skewness"),
+    ("param_kurtosis", "kurtosis"),
+    ("param_neg_ratio", "proportion of negative values"),
+    ("param_zero_ratio", "proportion of zeros"),
+)
+
+LAST_LAYER_SPEC = (
+    ("last_layer_mean", "mean"),
+    ("last_layer_std", "standard deviation"),
+    ("last_layer_min", "minimum"),
+    ("last_layer_max", "maximum"),
+    ("last_layer_abs_mean", "absolute mean"),
+    ("last_layer_neg_ratio", "negative ratio"),
+)
+
+DISTANCE_SPEC = (
+    ("avg_l1_distance", "average L1 distance"),
+    ("avg_l2_distance", "average L2 distance"),
+    ("cosine_similarity", "cosine similarity"),
+)
+
+# Pattern: "client 5", "client_id 5", "client#5"
+_CLIENT_ID_RE = re.compile(r'client[\s_#]*(\d+)', re.IGNORECASE)
+
+
+def _format_column(values: pd.Series) -> pd.Series:
+    """
+    Format a column for display: missing values become None, floats use
+    scientific notation when very small or very large, 4 decimals otherwise.
+    """
+    if pd.api.types.is_float_dtype(values):
+        magnitude = values.abs()
+        scientific = (magnitude < 0.0001) | (magnitude > 100000)
+        formatted = pd.Series(
+            np.where(scientific, values.map('{:.2e}'.format), values.map('{:.4f}'.format)),
+            index=values.index,
+            dtype=object
+        )
+    else:
+        formatted = values.astype(str).astype(object)
+    return formatted.where(values.notna(), None)
+
 
 class CSVAnalyzer:
     """
@@ -33,6 +105,14 @@ class CSVAnalyzer:
         """Initialize with CSV path"""
         self.csv_path = csv_path
         self.df: Optional[pd.DataFrame] = None
+        # Row positions by client_id / predicted label, built in _load_csv
+        self._by_client: Dict[Any, np.ndarray] = {}
+        self._malicious_pos = np.empty(0, dtype=np.intp)
+        self._benign_pos = np.empty(0, dtype=np.intp)
+        # Natural-language description per row position: full and id/round/label only
+        self._descriptions: List[str] = []
+        self._summary_descriptions: List[str] = []
+        self._shap_cols: List[str] = []
         self._load_csv()
     
     def _load_csv(self):
@@ -43,12 +123,33 @@ class CSVAnalyzer:
             if not Path(self.csv_path).exists():
                 raise FileNotFoundError(f"CSV not found: {self.csv_path}")
             
-            self.df = pd.read_csv(self.csv_path)
+            if HAS_PYARROW:
+                # Multithreaded C++ parser; true_label is dropped before
+                # the columns are ever materialized in pandas
+                table = pacsv.read_csv(
+                    self.csv_path,
+                    read_options=pacsv.ReadOptions(use_threads=True, block_size=CSV_BLOCK_SIZE)
+                )
+                if 'true_label' in table.column_names:
+                    table = table.drop(['true_label'])
+                self.df = table.to_pandas()
+            else:
+                self.df = pd.read_csv(self.csv_path)
             
             # Remove true_label (ground truth, should not be in LLM context)
             if 'true_label' in self.df.columns:
                 self.df = self.df.drop(columns=['true_label'])
             
+            self._shap_cols = [c for c in self.df.columns if c.startswith("SHAP")]
+            self._downcast()
+            self._build_indexes()
+            
+            # Rows never change after load, so render every description once
+            summary_cols = [c for c in ["client_id", "round_num", "predicted_label"]
+                            if c in self.df.columns]
+            self._descriptions = self._describe_rows(self.df)
+            self._summary_descriptions = self._describe_rows(self.df[summary_cols])
+            
             logger.info(f"✓ Loaded {len(self.df)} records, {len(self.df.columns)} columns")
             logger.info(f"✓ true_label excluded from all data")
             
@@ -56,22 +157,55 @@ class CSVAnalyzer:
             logger.error(f"Error loading CSV: {e}")
             raise
     
-    def _convert_row_to_natural_language(self, row: pd.Series) -> str:
+    def _downcast(self):
+        """Shrink ids/labels to the smallest int type and stats to float32"""
+        for col in ("client_id", "round_num", "predicted_label"):
+            if col in self.df.columns and pd.api.types.is_integer_dtype(self.df[col]):
+                self.df[col] = pd.to_numeric(self.df[col], downcast="integer")
+        
+        float_cols = self.df.select_dtypes("float64").columns
+        if len(float_cols):
+            self.df[float_cols] = self.df[float_cols].astype("float32")
+        
+        logger.info(f"✓ DataFrame memory: {self.df.memory_usage(deep=True).sum() / 1024:.1f} KiB")
+    
+    def _build_indexes(self):
+        """Precompute row positions for the client and label filters (the data is read-only)"""
+        if 'client_id' in self.df.columns:
+            self._by_client = self.df.groupby('client_id', sort=False).indices
+        
+        if 'predicted_label' in self.df.columns:
+            labels = self.df['predicted_label'].to_numpy()
+            self._malicious_pos = np.flatnonzero(labels == 1)
+            self._benign_pos = np.flatnonzero(labels == 0)
+    
+    def _describe_rows(self, rows: pd.DataFrame) -> List[str]:
+        """
+        Convert rows to natural-language descriptions.
+        
+        Values are formatted a whole column at a time, then rows are walked
+        as plain tuples instead of boxing each one into a Series.
+        """
+        columns = list(rows.columns)
+        formatted_rows = zip(*(_format_column(rows[col]).tolist() for col in columns))
+        raw_rows = rows.itertuples(index=False, name=None)
+        return [
+            self._convert_row_to_natural_language(dict(zip(columns, raw)), dict(zip(columns, formatted)))
+            for raw, formatted in zip(raw_rows, formatted_rows)
+        ]
+    
+    def _convert_row_to_natural_language(self, row: Dict[str, Any], formatted: Dict[str, Optional[str]]) -> str:
         """
         Convert a single row into fluent natural-language text,
         only including stats/SHAP values that exist.
+        
+        Args:
+            row: Raw values by column
+            formatted: Display strings by column (None for missing values)
         """
 
-        def fmt(val):
-            if val is None or pd.isna(val):
-                return None  # Return None instead of "N/A"
-            if isinstance(val, (float, np.floating)):
-                if abs(val) < 0.0001 or abs(val) > 100000:
-                    return f"{val:.2e}"
-                return f"{val:.4f}"
-            return str(val)
-
-        get = lambda col: row[col] if col in row.index else None
+        fmt = formatted.get
+        get = row.get
 
         client_id_val = get("client_id")
         round_num_val = get("round_num")
@@ -80,7 +214,7 @@ class CSVAnalyzer:
         round_num = str(int(round_num_val)) if round_num_val is not None and not pd.isna(round_num_val) else "N/A"
 
         raw_label = get("predicted_label")
-        # predicted_prob = fmt(get("predicted_prob"))
+        # predicted_prob = fmt("predicted_prob")
 
         # Label mapping
         if raw_label in [1, 1.0, "1", "1.0"]:
@@ -96,49 +230,22 @@ class CSVAnalyzer:
         # if predicted_prob is not None:
         #     parts[-1] += f" with confidence {predicted_prob}."
 
-        # Core statistics
-        stats_items = []
-        if fmt(get("param_mean")): stats_items.append(f"mean value of {fmt(get('param_mean'))}")
-        if fmt(get("param_std")): stats_items.append(f"standard deviation of {fmt(get('param_std'))}")
-        if fmt(get("param_min")): stats_items.append(f"minimum of {fmt(get('param_min'))}")
-        if fmt(get("param_max")): stats_items.append(f"maximum of {fmt(get('param_max'))}")
-        if fmt(get("param_median")): stats_items.append(f"median of {fmt(get('param_median'))}")
-        if fmt(get("param_range")): stats_items.append(f"value range of {fmt(get('param_range'))}")
-        if fmt(get("param_abs_mean")): stats_items.append(f"absolute mean of {fmt(get('param_abs_mean'))}")
-        if fmt(get("param_skew")): stats_items.append(f"skewness {fmt(get('param_skew'))}")
-        if fmt(get("param_kurtosis")): stats_items.append(f"kurtosis {fmt(get('param_kurtosis'))}")
-        if fmt(get("param_neg_ratio")): stats_items.append(f"proportion of negative values {fmt(get('param_neg_ratio'))}")
-        if fmt(get("param_zero_ratio")): stats_items.append(f"proportion of zeros {fmt(get('param_zero_ratio'))}")
-
-        if stats_items:
-            parts.append("The model update statistics show " + ", ".join(stats_items) + ".")
-
-        # Last layer stats
-        last_layer_items = []
-        if fmt(get("last_layer_mean")): last_layer_items.append(f"mean {fmt(get('last_layer_mean'))}")
-        if fmt(get("last_layer_std")): last_layer_items.append(f"standard deviation {fmt(get('last_layer_std'))}")
-        if fmt(get("last_layer_min")): last_layer_items.append(f"minimum {fmt(get('last_layer_min'))}")
-        if fmt(get("last_layer_max")): last_layer_items.append(f"maximum {fmt(get('last_layer_max'))}")
-        if fmt(get("last_layer_abs_mean")): last_layer_items.append(f"absolute mean {fmt(get('last_layer_abs_mean'))}")
-        if fmt(get("last_layer_neg_ratio")): last_layer_items.append(f"negative ratio {fmt(get('last_layer_neg_ratio'))}")
-
-        if last_layer_items:
-            parts.append("For the last model layer, " + ", ".join(last_layer_items) + ".")
-
-        # Distance metrics
-        distance_items = []
-        if fmt(get("avg_l1_distance")): distance_items.append(f"average L1 distance {fmt(get('avg_l1_distance'))}")
-        if fmt(get("avg_l2_distance")): distance_items.append(f"average L2 distance {fmt(get('avg_l2_distance'))}")
-        if fmt(get("cosine_similarity")): distance_items.append(f"cosine similarity {fmt(get('cosine_similarity'))}")
-
-        if distance_items:
-            parts.append("Distance metrics: " + ", ".join(distance_items) + ".")
+        sections = (
+            ("The model update statistics show ", STATS_SPEC),
+            ("For the last model layer, ", LAST_LAYER_SPEC),
+            ("Distance metrics: ", DISTANCE_SPEC),
+        )
+        for intro, spec in sections:
+            items = [f"{label} {value}" for col, label in spec if (value := fmt(col))]
+            if items:
+                parts.append(intro + ", ".join(items) + ".")
 
         # SHAP values
         shap_items = []
-        for col in row.index:
-            if col.startswith("SHAP") and fmt(get(col)):
-                shap_items.append(f"{col} contributed {fmt(get(col))}")
+        for col in self._shap_cols:
+            value = fmt(col)
+            if value:
+                shap_items.append(f"{col} contributed {value}")
         if shap_items:
             parts.append("SHAP analysis: " + ", ".join(shap_items) + ".")
 
@@ -146,72 +253,54 @@ class CSVAnalyzer:
     
     def _is_fl_system_question(self, question: str) -> bool:
         """Detect if question is about FL system or general knowledge"""
-        fl_keywords = [
-            'client', 'malicious', 'benign', 'detection', 'round', 'confidence',
-            'prediction', 'poisoned', 'attack', 'csv', 'data', 'statistics', 
-            'federated', 'learning', 'parameter', 'model', 'update', 'suspicious',
-            'accuracy', 'performance', 'anomal', 'detection rate'
-        ]
-        
-        question_lower = question.lower()
-        
         # If question contains FL keywords, it's FL-specific
-        for keyword in fl_keywords:
-            if keyword in question_lower:
-                return True
-        
-        return False
+        return _FL_KEYWORD_RE.search(question) is not None
     
     def _extract_client_id(self, question: str) -> Optional[int]:
         """Extract client_id from question"""
-        # Pattern: "client 5", "client_id 5", "client#5"
-        match = re.search(r'client[\s_#]*(\d+)', question, re.IGNORECASE)
+        match = _CLIENT_ID_RE.search(question)
         if match:
             return int(match.group(1))
         return None
     
-    def _select_relevant_rows(self, question: str) -> pd.DataFrame:
-        """Select up to 3 most relevant rows safely"""
+    def _select_relevant_rows(self, question: str) -> Tuple[np.ndarray, bool]:
+        """
+        Select the most relevant rows safely.
+        
+        Returns:
+            Tuple of (row positions, summary_only). Label queries only
+            describe the id/round/label columns of each row.
+        """
+        no_rows = np.empty(0, dtype=np.intp)
 
         if self.df is None or len(self.df) == 0:
-            return pd.DataFrame()
+            return no_rows, False
         
         question_lower = question.lower()
-        selected = self.df.copy()
         
-        # Strategy 1: Filter by client_id if mentioned
+        # Strategy 1: Filter by client_id if mentioned (up to 3 rows)
         client_id = self._extract_client_id(question)
-        if client_id is not None and 'client_id' in self.df.columns:
-            filtered = selected[selected['client_id'] == client_id]
-            if not filtered.empty:
+        if client_id is not None:
+            positions = self._by_client.get(client_id)
+            if positions is not None:
                 logger.info(f"Selected rows for client {client_id}")
-                return filtered.head(3)
+                return positions[:3], False
         
         # Strategy 2: Filter by malicious
         if ("malicious" in question_lower or "poisoned" in question_lower) and \
-        "predicted_label" in selected.columns:
-            
-            filtered = selected[selected["predicted_label"] == 1]
-            if not filtered.empty:
-                logger.info("Selected malicious rows")
-                cols = [c for c in ["client_id", "round_num", "predicted_label"]
-                        if c in filtered.columns]
-                return filtered[cols]
+        len(self._malicious_pos):
+            logger.info("Selected malicious rows")
+            return self._malicious_pos, True
         
         # Strategy 2b: Filter by benign
         if ("benign" in question_lower or "normal" in question_lower) and \
-        "predicted_label" in selected.columns:
-            
-            filtered = selected[selected["predicted_label"] == 0]
-            if not filtered.empty:
-                logger.info("Selected benign rows")
-                cols = [c for c in ["client_id", "round_num", "predicted_label"]
-                        if c in filtered.columns]
-                return filtered[cols]
+        len(self._benign_pos):
+            logger.info("Selected benign rows")
+            return self._benign_pos, True
         
-        # Strategy 3: No match → return EMPTY DataFrame
-        logger.info("No relevant rows found, returning empty DataFrame")
-        return pd.DataFrame()
+        # Strategy 3: No match → no rows
+        logger.info("No relevant rows found")
+        return no_rows, False
     
     def get_context_for_question(self, question: str) -> Tuple[str, bool]:
         """
@@ -229,32 +318,30 @@ class CSVAnalyzer:
             return "", False
         
         # FL-specific question - get relevant rows
-        relevant_rows = self._select_relevant_rows(question)
+        positions, summary_only = self._select_relevant_rows(question)
         
-        if relevant_rows.empty:
+        if len(positions) == 0:
             logger.info("No relevant rows found for this question")
             return "No relevant data found in the dataset.", True
         
-        # Convert rows to natural language
-        descriptions = []
-        for idx, row in relevant_rows.iterrows():
-            description = self._convert_row_to_natural_language(row)
-            descriptions.append(description)
-        
-        # Combine descriptions into context text
-        context = "\n\n".join(descriptions)
+        # Descriptions were rendered once at load time
+        descriptions = self._summary_descriptions if summary_only else self._descriptions
+        context = "\n\n".join([descriptions[i] for i in positions])
         
         logger.info(f"Context length: {len(context)} chars")
         return context, True
 
 # Global instance
 _analyzer: Optional[CSVAnalyzer] = None
+_analyzer_lock = threading.Lock()
 
 
 def get_csv_analyzer() -> CSVAnalyzer:
     """Get or initialize the CSV analyzer"""
     global _analyzer
     if _analyzer is None:
-        from chatbot_app.config import FL_DATA_CSV_PATH
-        _analyzer = CSVAnalyzer(FL_DATA_CSV_PATH)
+        with _analyzer_lock:
+            if _analyzer is None:
+                from chatbot_app.config import FL_DATA_CSV_PATH
+                _analyzer = CSVAnalyzer(FL_DATA_CSV_PATH)
     return _analyzer
@@ -0,0 +1,54 @@
+"""
+Number formatting helpers shared by the analyzers
+"""
+
+from typing import List, Sequence
+
+import numpy as np
+
+
+def fmt_float(x: float) -> str:
+    """Format a float for display, in scientific notation when very small or large"""
+    ax = abs(x)
+    return f"{x:.2e}" if ax < 1e-4 or ax > 1e5 else f"{x:.6f}"
+
+
+def fmt_float32(x: float) -> str:
+    """
+    fmt_float for a value stored as float32: fewer decimals as the integer
+    part grows, so no digits beyond float32's ~7 significant are printed
+    """
+    ax = abs(x)
+    if ax < 1e-4 or ax > 1e5:
+        return f"{x:.2e}"
+    decimals = min(6, 7 - len(str(int(ax))))
+    return f"{x:.{decimals}f}"
+
+
+def fmt_value(value) -> str:
+    """fmt_float for floats, str() for anything else"""
+    return fmt_float(value) if isinstance(value, float) else str(value)
+
+
+def fmt_floats(values: np.ndarray) -> np.ndarray:
+    """Vectorized fmt_float over a float array"""
+    magnitude = np.abs(values)
+    scientific = (magnitude < 1e-4) | (magnitude > 1e5)
+    return np.where(scientific, np.char.mod('%.2e', values), np.char.mod('%.6f', values))
+
+
+def fmt_values(values: Sequence) -> List[str]:
+    """
+    Format a mixed sequence for display.
+
+    Floats are formatted together in one vectorized pass; anything else
+    falls back to str().
+    """
+    is_float = [isinstance(v, float) for v in values]
+    if not any(is_float):
+        return [str(v) for v in values]
+
+    formatted = iter(fmt_floats(np.array(
+        [v for v, f in zip(values, is_float) if f], dtype=np.float64
+    )).tolist())
+    return [next(formatted) if f else str(v) for v, f in zip(values, is_float)]
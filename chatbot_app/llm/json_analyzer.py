@@ -8,15 +8,20 @@ Features:
 4. Distinguish general vs FL-specific questions
 """
 
+import io
 import logging
 import json
 import os
 from pathlib import Path
-from typing import Optional, Tuple, List
+from typing import NamedTuple, Optional, Tuple, List
 import re
+import threading
+
+import numpy as np
 
 try:
     import boto3
+    from boto3.s3.transfer import TransferConfig
     from botocore.exceptions import ClientError
     HAS_BOTO3 = True
 except ImportError:
@@ -24,10 +29,157 @@ except ImportError:
     logger = logging.getLogger(__name__)
     logger.warning("boto3 not installed - S3 functionality disabled. Install with: pip install boto3")
 
-from chatbot_app.llm.models import RoundData, ClientRecord, Features
+try:
+    import orjson
+    HAS_ORJSON = True
+except ImportError:
+    HAS_ORJSON = False
+
+from chatbot_app.llm.models import FEATURE_KEYS, RoundData, ClientRecord, Features
+from chatbot_app.llm.formatting import fmt_floats, fmt_value, fmt_values
+from chatbot_app.llm.ranking import top_k_desc
 
 logger = logging.getLogger(__name__)
 
+FL_KEYWORDS = (
+    'client', 'malicious', 'benign', 'detection', 'round', 'confidence',
+    'classification', 'probability', 'suspicious', 'attack', 'anomal',
+    'federated', 'learning', 'model', 'update', 'poisoned', 'feature',
+    'parameter', 'csv', 'data', 'statistics', 'detection rate', 'accuracy'
+)
+
+# One case-insensitive alternation scanned in C, instead of a Python
+# substring check per keyword
+_FL_KEYWORD_RE = re.compile("|".join(map(re.escape, FL_KEYWORDS)), re.IGNORECASE)
+
+# Pattern: "client 5", "client_id 5", "client#5"
+_CLIENT_ID_RE = re.compile(r'client[\s_#]*(\d+)', re.IGNORECASE)
+_ROUND_RE = re.compile(r'round[\s_#]*(\d+)', re.IGNORECASE)
+
+
+
+class _QuestionInfo(NamedTuple):
+    """Everything the selection strategies need from a question, computed once"""
+    lower: str
+    is_fl: bool
+    client_id: Optional[int]
+    round_num: Optional[int]
+    wants_malicious: bool
+    wants_benign: bool
+    wants_high_conf: bool
+
+
+def _parse_question(question: str) -> _QuestionInfo:
+    """Normalize and scan a question a single time"""
+    lower = question.lower()
+    client_match = _CLIENT_ID_RE.search(lower)
+    round_match = _ROUND_RE.search(lower)
+    return _QuestionInfo(
+        lower=lower,
+        is_fl=_FL_KEYWORD_RE.search(lower) is not None,
+        client_id=int(client_match.group(1)) if client_match else None,
+        round_num=int(round_match.group(1)) if round_match else None,
+        wants_malicious='malicious' in lower or 'poisoned' in lower,
+        wants_benign='benign' in lower or 'normal' in lower,
+        wants_high_conf=(
+            ('confidence' in lower or 'confident' in lower)
+            and ('high' in lower or 'highest' in lower)
+        )
+    )
+
+
+# (display label, Features attribute) for every feature in the client report
+_FEATURE_LABEL_ATTR: Tuple[Tuple[str, str], ...] = (
+    ("Parameter Mean", "param_mean"),
+    ("Parameter Std Dev", "param_std"),
+    ("Parameter Min", "param_min"),
+    ("Parameter Max", "param_max"),
+    ("Parameter Median", "param_median"),
+    ("Parameter Range", "param_range"),
+    ("Parameter Abs Mean", "param_abs_mean"),
+    ("Parameter Skewness", "param_skew"),
+    ("Parameter Kurtosis", "param_kurtosis"),
+    ("Parameter Neg Ratio", "param_neg_ratio"),
+    ("Parameter Zero Ratio", "param_zero_ratio"),
+    ("Last Layer Mean", "last_layer_mean"),
+    ("Last Layer Std Dev", "last_layer_std"),
+    ("Last Layer Min", "last_layer_min"),
+    ("Last Layer Max", "last_layer_max"),
+    ("Last Layer Abs Mean", "last_layer_abs_mean"),
+    ("Last Layer Neg Ratio", "last_layer_neg_ratio"),
+    ("First vs Last Mean Ratio", "first_vs_last_mean_ratio"),
+    ("First vs Last Std Ratio", "first_vs_last_std_ratio"),
+    ("Avg L1 Distance", "avg_l1_distance"),
+    ("Avg L2 Distance", "avg_l2_distance"),
+    ("Cosine Similarity", "cosine_similarity"),
+)
+
+# Local cache for S3 downloads, shared by every analyzer instance
+CACHE_DIR = Path("/tmp/fl_data_cache")
+CACHE_DIR.mkdir(exist_ok=True)
+
+# boto3 clients are expensive to build (service model load, credential
+# resolution) and thread-safe, so one is shared for all downloads
+_s3_client = None
+_s3_client_lock = threading.Lock()
+
+# Objects over 1 MB are fetched as parallel 4 MB byte ranges
+if HAS_BOTO3:
+    _TRANSFER_CONFIG = TransferConfig(
+        multipart_threshold=1024 * 1024,
+        multipart_chunksize=4 * 1024 * 1024,
+        max_concurrency=8,
+        use_threads=True
+    )
+
+
+def _get_s3_client():
+    """Get or create the shared S3 client"""
+    global _s3_client
+    
+    if _s3_client is None:
+        with _s3_client_lock:
+            if _s3_client is None:
+                _s3_client = boto3.client('s3')
+    
+    return _s3_client
+
+
+def _is_cache_fresh(cache_file: Path, head: dict) -> bool:
+    """True when the cached file matches the S3 object's size and is not older than it"""
+    if not cache_file.exists():
+        return False
+    stat = cache_file.stat()
+    return (
+        stat.st_size == head['ContentLength']
+        and stat.st_mtime >= head['LastModified'].timestamp()
+    )
+
+
+def _write_cache(cache_file: Path, raw: bytes):
+    """Write a downloaded object to the local cache via a temp file"""
+    try:
+        tmp_file = cache_file.with_name(cache_file.name + ".part")
+        tmp_file.write_bytes(raw)
+        os.replace(tmp_file, cache_file)
+    except OSError as e:
+        logger.warning(f"Could not write cache file {cache_file}: {e}")
+
+
+def _parse_json(raw: bytes):
+    """
+    Parse a JSON document, with orjson when available.
+    
+    orjson rejects the NaN/Infinity literals Python's json module writes,
+    so those documents fall back to the stdlib parser.
+    """
+    if HAS_ORJSON:
+        try:
+            return orjson.loads(raw)
+        except orjson.JSONDecodeError:
+            pass
+    return json.loads(raw)
+
 
 class JSONAnalyzer:
     """
@@ -48,21 +200,36 @@ class JSONAnalyzer:
         """
         self.s3_path = s3_path
         self.local_path = local_path
-        self.data: Optional[RoundData] = None
-        self.cache_dir = Path("/tmp/fl_data_cache")
-        self.cache_dir.mkdir(exist_ok=True)
-        
-        self._load_data()
+        self._data: Optional[RoundData] = None
+        self._data_lock = threading.Lock()
+        self.cache_dir = CACHE_DIR
+        # Client positions per selection strategy, fixed once the round is loaded
+        self._malicious_idx: List[int] = []
+        self._benign_idx: List[int] = []
+        self._top_conf_idx: List[int] = []
+    
+    @property
+    def data(self) -> Optional[RoundData]:
+        """Round data, downloaded and parsed on first access"""
+        if self._data is None:
+            with self._data_lock:
+                if self._data is None:
+                    self._load_data()
+        return self._data
     
-    def _download_from_s3(self, s3_path: str) -> str:
+    def _download_from_s3(self, s3_path: str) -> bytes:
         """
         Download JSON from S3 bucket.
         
+        The object is read into memory and parsed from there; the local
+        cache copy is written on a background thread so parsing never
+        waits on the disk.
+        
         Args:
             s3_path: S3 path like "s3://bucket-name/path/to/file.json"
         
         Returns:
-            Local file path
+            Raw JSON bytes
         """
         if not HAS_BOTO3:
             raise RuntimeError(
@@ -84,15 +251,30 @@ class JSONAnalyzer:
             
             logger.info(f"Downloading from S3: s3://{bucket}/{key}")
             
-            # Create local cache file
+            # Local cache file
             cache_file = self.cache_dir / Path(key).name
             
-            # Download from S3
-            s3 = boto3.client('s3')
-            s3.download_file(bucket, key, str(cache_file))
+            # Skip the transfer when the cached copy is already current
+            s3 = _get_s3_client()
+            head = s3.head_object(Bucket=bucket, Key=key)
+            if _is_cache_fresh(cache_file, head):
+                logger.info(f"✓ Cache is up to date: {cache_file}")
+                return cache_file.read_bytes()
+            
+            # Download from S3 straight into memory
+            buffer = io.BytesIO()
+            s3.download_fileobj(bucket, key, buffer, Config=_TRANSFER_CONFIG)
+            raw = buffer.getvalue()
+            
+            threading.Thread(
+                target=_write_cache,
+                args=(cache_file, raw),
+                name="fl-cache-writer",
+                daemon=True
+            ).start()
             
-            logger.info(f"✓ Downloaded to {cache_file}")
-            return str(cache_file)
+            logger.info(f"✓ Downloaded {len(raw)} bytes")
+            return raw
             
         except Exception as e:
             logger.error(f"Error downloading from S3: {e}")
@@ -101,40 +283,51 @@ class JSONAnalyzer:
     def _load_data(self):
         """Load JSON data from S3 or local file"""
         try:
-            file_path = None
+            raw = None
             
             # Try S3 first if provided
             if self.s3_path:
                 try:
-                    file_path = self._download_from_s3(self.s3_path)
+                    raw = self._download_from_s3(self.s3_path)
                 except Exception as e:
                     logger.warning(f"S3 download failed: {e}, trying local path")
             
             # Fall back to local path
-            if file_path is None and self.local_path:
+            if raw is None and self.local_path:
                 if not Path(self.local_path).exists():
                     raise FileNotFoundError(f"Local file not found: {self.local_path}")
-                file_path = self.local_path
+                logger.info(f"Loading JSON from {self.local_path}")
+                with open(self.local_path, 'rb') as f:
+                    raw = f.read()
             
-            if file_path is None:
+            if raw is None:
                 raise ValueError("No valid S3 or local path provided")
             
             # Load JSON
-            logger.info(f"Loading JSON from {file_path}")
-            with open(file_path, 'r') as f:
-                json_data = json.load(f)
+            json_data = _parse_json(raw)
             
             # Parse into data model
-            self.data = RoundData.from_dict(json_data)
+            data = RoundData.from_dict(json_data)
+            self._malicious_idx = np.flatnonzero(data.is_malicious).tolist()
+            self._benign_idx = np.flatnonzero(data.is_benign).tolist()
+            self._top_conf_idx = top_k_desc(data.probabilities, 3)
+            # Published last: other threads check _data without the lock
+            self._data = data
             
-            logger.info(f"✓ Loaded round {self.data.round_num}")
-            logger.info(f"✓ {len(self.data.clients)} clients, {self.data.num_samples} samples")
-            logger.info(f"✓ Timestamp: {self.data.timestamp}")
+            logger.info(f"✓ Loaded round {data.round_num}")
+            logger.info(f"✓ {len(data.clients)} clients, {data.num_samples} samples")
+            logger.info(f"✓ Timestamp: {data.timestamp}")
             
         except Exception as e:
             logger.error(f"Error loading JSON: {e}")
             raise
     
+    def _describe_client(self, client: ClientRecord) -> str:
+        """Get the client's natural language description, building it once"""
+        if client.description is None:
+            client.description = self._convert_client_to_natural_language(client)
+        return client.description
+    
     def _convert_client_to_natural_language(self, client: ClientRecord) -> str:
         """
         Convert client record to comprehensive natural language description.
@@ -150,130 +343,85 @@ class JSONAnalyzer:
         classification = client.classification.capitalize()
         confidence_pct = client.malicious_probability * 100
         
-        desc = f"Client {client.client_id}: {classification} ({confidence_pct:.1f}% confidence)"
+        parts = [
+            f"Client {client.client_id}: {classification} ({confidence_pct:.1f}% confidence)",
+            "",
+            "Feature Values:"
+        ]
         
         # Add all feature values
         features = client.features
-        desc += "\n\nFeature Values:"
-        
-        feature_values = [
-            ("Parameter Mean", features.param_mean),
-            ("Parameter Std Dev", features.param_std),
-            ("Parameter Min", features.param_min),
-            ("Parameter Max", features.param_max),
-            ("Parameter Median", features.param_median),
-            ("Parameter Range", features.param_range),
-            ("Parameter Abs Mean", features.param_abs_mean),
-            ("Parameter Skewness", features.param_skew),
-            ("Parameter Kurtosis", features.param_kurtosis),
-            ("Parameter Neg Ratio", features.param_neg_ratio),
-            ("Parameter Zero Ratio", features.param_zero_ratio),
-            ("Last Layer Mean", features.last_layer_mean),
-            ("Last Layer Std Dev", features.last_layer_std),
-            ("Last Layer Min", features.last_layer_min),
-            ("Last Layer Max", features.last_layer_max),
-            ("Last Layer Abs Mean", features.last_layer_abs_mean),
-            ("Last Layer Neg Ratio", features.last_layer_neg_ratio),
-            ("First vs Last Mean Ratio", features.first_vs_last_mean_ratio),
-            ("First vs Last Std Ratio", features.first_vs_last_std_ratio),
-            ("Avg L1 Distance", features.avg_l1_distance),
-            ("Avg L2 Distance", features.avg_l2_distance),
-            ("Cosine Similarity", features.cosine_similarity),
-        ]
-        
-        for fname, fvalue in feature_values:
-            if isinstance(fvalue, float):
-                if abs(fvalue) < 0.0001 or abs(fvalue) > 100000:
-                    desc += f"\n  - {fname}: {fvalue:.2e}"
-                else:
-                    desc += f"\n  - {fname}: {fvalue:.6f}"
-            else:
-                desc += f"\n  - {fname}: {fvalue}"
+        feature_strs = fmt_values([getattr(features, attr) for _, attr in _FEATURE_LABEL_ATTR])
+        for (fname, _), fvalue_str in zip(_FEATURE_LABEL_ATTR, feature_strs):
+            parts.append(f"  - {fname}: {fvalue_str}")
         
         # Add SHAP values if available
-        if client.shap_values and client.shap_values.feature_shap_values:
-            desc += "\n\nFeature Importance (SHAP Values):"
-            desc += f"\n  Base Value: {client.shap_values.base_value}"
+        shap = client.shap_values
+        if shap is not None and shap.values.size:
+            parts.append("")
+            parts.append("Feature Importance (SHAP Values):")
+            parts.append(f"  Base Value: {shap.base_value}")
             
-            shap_dict = client.shap_values.feature_shap_values
-            for feature_name, shap_value in sorted(shap_dict.items(), key=lambda x: abs(x[1]), reverse=True):
-                if isinstance(shap_value, float):
-                    if abs(shap_value) < 0.0001 or abs(shap_value) > 100000:
-                        desc += f"\n  - {feature_name}: {shap_value:.2e} (contribution)"
-                    else:
-                        desc += f"\n  - {feature_name}: {shap_value:.6f} (contribution)"
-                else:
-                    desc += f"\n  - {feature_name}: {shap_value} (contribution)"
+            # Largest contribution first; ties keep file order
+            order = np.argsort(-np.abs(shap.values), kind='stable')
+            shap_strs = fmt_floats(shap.values[order]).tolist()
+            for i, shap_str in zip(order.tolist(), shap_strs):
+                parts.append(f"  - {shap.feature_names[i]}: {shap_str} (contribution)")
         
-        return desc
+        return "\n".join(parts)
     
     def _is_fl_system_question(self, question: str) -> bool:
         """Detect if question is about FL system or general knowledge"""
-        fl_keywords = [
-            'client', 'malicious', 'benign', 'detection', 'round', 'confidence',
-            'classification', 'probability', 'suspicious', 'attack', 'anomal',
-            'federated', 'learning', 'model', 'update', 'poisoned', 'feature',
-            'parameter', 'csv', 'data', 'statistics', 'detection rate', 'accuracy'
-        ]
-        
-        question_lower = question.lower()
-        
-        for keyword in fl_keywords:
-            if keyword in question_lower:
-                return True
-        
-        return False
+        return _FL_KEYWORD_RE.search(question) is not None
     
     def _extract_client_id(self, question: str) -> Optional[int]:
         """Extract client_id from question"""
-        match = re.search(r'client[\s_#]*(\d+)', question, re.IGNORECASE)
+        match = _CLIENT_ID_RE.search(question)
         if match:
             return int(match.group(1))
         return None
     
     def _extract_round_num(self, question: str) -> Optional[int]:
         """Extract round number from question"""
-        match = re.search(r'round[\s_#]*(\d+)', question, re.IGNORECASE)
+        match = _ROUND_RE.search(question)
         if match:
             return int(match.group(1))
         return None
     
-    def _select_relevant_clients(self, question: str) -> List[ClientRecord]:
+    def _select_relevant_clients(self, info: _QuestionInfo) -> List[ClientRecord]:
         """Select up to 3 most relevant client records"""
         if self.data is None or len(self.data.clients) == 0:
             return []
         
-        question_lower = question.lower()
-        clients = self.data.clients
+        data = self.data
+        clients = data.clients
         
         # Strategy 1: Specific client ID
-        client_id = self._extract_client_id(question)
+        client_id = info.client_id
         if client_id is not None:
-            matching = [c for c in clients if c.client_id == client_id]
-            if matching:
+            positions = data.client_positions.get(client_id)
+            if positions:
                 logger.info(f"Selected client {client_id}")
-                return matching[:3]
+                return [clients[i] for i in positions[:3]]
         
         # Strategy 2: Malicious clients
-        if 'malicious' in question_lower or 'poisoned' in question_lower:
-            malicious = [c for c in clients if c.classification == 'malicious']
+        if info.wants_malicious:
+            malicious = self._malicious_idx
             if malicious:
                 logger.info(f"Selected {len(malicious)} malicious clients")
-                return malicious[:3]
+                return [clients[i] for i in malicious[:3]]
         
         # Strategy 3: Benign clients
-        if 'benign' in question_lower or 'normal' in question_lower:
-            benign = [c for c in clients if c.classification == 'benign']
+        if info.wants_benign:
+            benign = self._benign_idx
             if benign:
                 logger.info(f"Selected {len(benign)} benign clients")
-                return benign[:3]
+                return [clients[i] for i in benign[:3]]
         
         # Strategy 4: High confidence
-        if 'confidence' in question_lower or 'confident' in question_lower:
-            if 'high' in question_lower or 'highest' in question_lower:
-                sorted_clients = sorted(clients, key=lambda c: c.malicious_probability, reverse=True)
-                logger.info(f"Selected top 3 high confidence clients")
-                return sorted_clients[:3]
+        if info.wants_high_conf:
+            logger.info(f"Selected top 3 high confidence clients")
+            return [clients[i] for i in self._top_conf_idx]
         
         # Strategy 5: Default - first 3 clients
         logger.info(f"Selected first 3 clients (default)")
@@ -295,66 +443,51 @@ class JSONAnalyzer:
         
         try:
             # Find client in current round data
-            matching_clients = [c for c in self.data.clients if c.client_id == client_id]
+            positions = self.data.client_positions.get(client_id)
             
-            if not matching_clients:
+            if not positions:
                 logger.warning(f"Client {client_id} not found in round {self.data.round_num}")
                 return None
             
-            client = matching_clients[0]
+            client = self.data.clients[positions[0]]
             
             # Build description with top SHAP features
             classification = client.classification.capitalize()
             confidence_pct = client.malicious_probability * 100
             
-            desc = f"**Client {client_id} Analysis**\n\n"
-            desc += f"Classification: {classification} ({confidence_pct:.2f}% confidence)\n"
-            desc += f"Round: {self.data.round_num}\n\n"
+            parts = [
+                f"**Client {client_id} Analysis**\n\n",
+                f"Classification: {classification} ({confidence_pct:.2f}% confidence)\n",
+                f"Round: {self.data.round_num}\n\n"
+            ]
             
             # Get top N features by SHAP value
-            if client.shap_values and client.shap_values.feature_shap_values:
-                shap_dict = client.shap_values.feature_shap_values
-                features_dict = {
-                    k: v for k, v in vars(client.features).items() 
-                    if not k.startswith('_')
-                }
+            shap = client.shap_values
+            if shap is not None and shap.values.size:
+                features = client.features
+                features_dict = {key: getattr(features, key) for key in FEATURE_KEYS}
                 
-                # Sort by absolute SHAP value
-                sorted_features = sorted(
-                    shap_dict.items(),
-                    key=lambda x: abs(float(x[1])) if x[1] is not None else 0,
-                    reverse=True
-                )[:top_n]
+                # Top N by absolute SHAP value
+                magnitudes = np.nan_to_num(np.abs(shap.values), nan=0.0)
+                sorted_features = [
+                    (shap.feature_names[i], float(shap.values[i]))
+                    for i in top_k_desc(magnitudes, top_n)
+                ]
                 
-                desc += "**Top Contributing Features (SHAP):**\n\n"
+                parts.append("**Top Contributing Features (SHAP):**\n\n")
                 
                 for idx, (feature_name, shap_value) in enumerate(sorted_features, 1):
                     feature_value = features_dict.get(feature_name, "N/A")
                     
-                    # Format feature value
-                    if isinstance(feature_value, float):
-                        if abs(feature_value) < 0.0001 or abs(feature_value) > 100000:
-                            feat_str = f"{feature_value:.2e}"
-                        else:
-                            feat_str = f"{feature_value:.6f}"
-                    else:
-                        feat_str = str(feature_value)
-                    
-                    # Format SHAP value
-                    if isinstance(shap_value, float):
-                        if abs(shap_value) < 0.0001 or abs(shap_value) > 100000:
-                            shap_str = f"{shap_value:.2e}"
-                        else:
-                            shap_str = f"{shap_value:.6f}"
-                    else:
-                        shap_str = str(shap_value)
+                    feat_str = fmt_value(feature_value)
+                    shap_str = fmt_value(shap_value)
                     
-                    desc += f"{idx}. **{feature_name}**: Value={feat_str}, SHAP={shap_str}\n"
+                    parts.append(f"{idx}. **{feature_name}**: Value={feat_str}, SHAP={shap_str}\n")
             else:
-                desc += "No SHAP analysis available for this client."
+                parts.append("No SHAP analysis available for this client.")
             
             logger.info(f"Generated SHAP context for client {client_id}")
-            return desc
+            return "".join(parts)
             
         except Exception as e:
             logger.error(f"Error getting client SHAP features: {e}", exc_info=True)
@@ -365,23 +498,20 @@ class JSONAnalyzer:
         Get context for the question.
         Returns: (context_text, is_fl_question)
         """
-        is_fl_question = self._is_fl_system_question(question)
+        info = _parse_question(question)
         
-        if not is_fl_question:
+        if not info.is_fl:
             logger.info("General knowledge question - no JSON context needed")
             return "", False
         
         # FL-specific question - get relevant clients
-        relevant_clients = self._select_relevant_clients(question)
+        relevant_clients = self._select_relevant_clients(info)
         
         if len(relevant_clients) == 0:
             return "No relevant detection data found in the dataset.", True
         
         # Convert to natural language
-        descriptions = []
-        for client in relevant_clients:
-            description = self._convert_client_to_natural_language(client)
-            descriptions.append(description)
+        descriptions = [self._describe_client(client) for client in relevant_clients]
         
         # Build context
         context = f"""
@@ -400,12 +530,15 @@ Relevant Detection Records:
 
 # Global instance
 _analyzer: Optional[JSONAnalyzer] = None
+_analyzer_lock = threading.Lock()
 
 
 def get_json_analyzer() -> JSONAnalyzer:
     """Get or initialize the JSON analyzer"""
     global _analyzer
     if _analyzer is None:
-        from chatbot_app.config import FL_DATA_S3_PATH, FL_DATA_LOCAL_PATH
-        _analyzer = JSONAnalyzer(s3_path=FL_DATA_S3_PATH, local_path=FL_DATA_LOCAL_PATH)
+        with _analyzer_lock:
+            if _analyzer is None:
+                from chatbot_app.config import FL_DATA_S3_PATH, FL_DATA_LOCAL_PATH
+                _analyzer = JSONAnalyzer(s3_path=FL_DATA_S3_PATH, local_path=FL_DATA_LOCAL_PATH)
     return _analyzer
@@ -2,12 +2,15 @@
 Data models for FL system JSON data
 """
 
-from typing import Dict, Optional, Any
-from dataclasses import dataclass, asdict
+from collections.abc import Sequence
+from typing import Dict, List, Optional, Any, Tuple
+from dataclasses import dataclass, asdict, field, fields
 import json
 
+import numpy as np
 
-@dataclass
+
+@dataclass(slots=True)
 class Features:
     """Client feature values"""
     param_mean: float
@@ -36,25 +39,51 @@ class Features:
     @classmethod
     def from_dict(cls, data: Dict[str, Any]) -> 'Features':
         """Create from dictionary"""
-        return cls(**data)
+        return cls(*[data[key] for key in FEATURE_KEYS])
+
+
+# Feature names in declaration order, for positional construction and iteration
+FEATURE_KEYS = tuple(f.name for f in fields(Features))
 
 
-@dataclass
+@dataclass(slots=True)
 class ShapValues:
-    """SHAP interpretation values"""
+    """
+    SHAP interpretation values.
+    
+    Stored as parallel columns (feature names, contribution array) so
+    ranking features is a vectorized op over one array.
+    """
     base_value: float
-    feature_shap_values: Dict[str, float]
+    feature_names: Tuple[str, ...] = ()
+    values: np.ndarray = field(default_factory=lambda: np.zeros(0, dtype=np.float64))
+    _shap_dict: Optional[Dict[str, float]] = field(default=None, init=False, repr=False, compare=False)
+
+    @property
+    def feature_shap_values(self) -> Dict[str, float]:
+        """Feature name -> SHAP contribution, rebuilt from the columns on first use"""
+        if self._shap_dict is None:
+            self._shap_dict = dict(zip(self.feature_names, self.values.tolist()))
+        return self._shap_dict
 
     @classmethod
     def from_dict(cls, data: Dict[str, Any]) -> 'ShapValues':
         """Create from dictionary"""
+        shap_dict = data.get('feature_shap_values', {})
         return cls(
             base_value=data.get('base_value', 0.0),
-            feature_shap_values=data.get('feature_shap_values', {})
+            feature_names=tuple(shap_dict),
+            # float64 keeps the contributions exactly as they were serialized;
+            # missing values become NaN
+            values=np.fromiter(
+                (np.nan if v is None else v for v in shap_dict.values()),
+                dtype=np.float64,
+                count=len(shap_dict)
+            )
         )
 
 
-@dataclass
+@dataclass(slots=True)
 class ClientRecord:
     """Single client detection record"""
     client_id: int
@@ -63,6 +92,8 @@ class ClientRecord:
     malicious_probability: float
     features: Features
     shap_values: Optional[ShapValues] = None
+    # Natural-language description, filled in on first use (records are immutable once loaded)
+    description: Optional[str] = field(default=None, init=False, repr=False, compare=False)
 
     @classmethod
     def from_dict(cls, data: Dict[str, Any]) -> 'ClientRecord':
@@ -82,21 +113,65 @@ class ClientRecord:
         )
 
 
-@dataclass
+class LazyClientList(Sequence):
+    """
+    Client records built from their raw dicts on first access.
+    
+    Questions only ever look at a handful of clients, so the rest of the
+    round is never turned into dataclasses.
+    """
+    
+    def __init__(self, raw_clients: List[Dict[str, Any]]):
+        self._raw = raw_clients
+        self._records: List[Optional[ClientRecord]] = [None] * len(raw_clients)
+    
+    def __len__(self) -> int:
+        return len(self._raw)
+    
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        record = self._records[index]
+        if record is None:
+            record = ClientRecord.from_dict(self._raw[index])
+            self._records[index] = record
+        return record
+
+
+@dataclass(slots=True)
 class RoundData:
     """Single round detection data"""
     round_num: int
     timestamp: str
     num_samples: int
-    clients: list  # List of ClientRecord
+    clients: LazyClientList
+    # Per-client columns (one entry per client, in file order) so selection
+    # runs as vectorized NumPy ops and never materializes records
+    client_positions: Dict[int, List[int]] = field(default_factory=dict)  # client_id -> positions
+    is_malicious: np.ndarray = field(default_factory=lambda: np.zeros(0, dtype=bool))
+    is_benign: np.ndarray = field(default_factory=lambda: np.zeros(0, dtype=bool))
+    probabilities: np.ndarray = field(default_factory=lambda: np.zeros(0, dtype=np.float64))
 
     @classmethod
     def from_dict(cls, data: Dict[str, Any]) -> 'RoundData':
         """Create from dictionary"""
-        clients = [ClientRecord.from_dict(c) for c in data.get('clients', [])]
+        raw_clients = data.get('clients', [])
+        client_positions: Dict[int, List[int]] = {}
+        for position, raw in enumerate(raw_clients):
+            client_positions.setdefault(raw['client_id'], []).append(position)
         return cls(
             round_num=data['round_num'],
             timestamp=data['timestamp'],
             num_samples=data['num_samples'],
-            clients=clients
+            clients=LazyClientList(raw_clients),
+            client_positions=client_positions,
+            is_malicious=np.fromiter(
+                (raw['classification'] == 'malicious' for raw in raw_clients), dtype=bool, count=len(raw_clients)
+            ),
+            is_benign=np.fromiter(
+                (raw['classification'] == 'benign' for raw in raw_clients), dtype=bool, count=len(raw_clients)
+            ),
+            probabilities=np.fromiter(
+                (raw['malicious_probability'] for raw in raw_clients), dtype=np.float64, count=len(raw_clients)
+            )
         )
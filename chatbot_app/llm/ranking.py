@@ -0,0 +1,26 @@
+"""
+Top-k helpers shared by the analyzers
+"""
+
+from typing import List
+
+import numpy as np
+
+
+def top_k_desc(values: np.ndarray, k: int) -> List[int]:
+    """
+    Positions of the k largest values, largest first.
+    
+    Selection is O(n) via argpartition instead of a full sort. Ties keep
+    their original order, so the result matches
+    sorted(range(n), key=values.__getitem__, reverse=True)[:k].
+    """
+    n = len(values)
+    k = min(k, n)
+    if k == 0:
+        return []
+    threshold = values[np.argpartition(-values, k - 1)[k - 1]]
+    # Everything tied with the k-th value competes, so ties resolve by position
+    candidates = np.flatnonzero(values >= threshold)
+    order = np.lexsort((candidates, -values[candidates]))
+    return candidates[order[:k]].tolist()
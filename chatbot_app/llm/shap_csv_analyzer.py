@@ -9,13 +9,44 @@ Provides:
 """
 
 import logging
+import os
+import re
+import threading
 import pandas as pd
 import numpy as np
 from pathlib import Path
 from typing import Optional, Dict, Any, List
 
+from chatbot_app.llm.formatting import fmt_float, fmt_float32
+from chatbot_app.llm.ranking import top_k_desc
+
+try:
+    import pyarrow  # noqa: F401
+    HAS_PYARROW = True
+except ImportError:
+    HAS_PYARROW = False
+
 logger = logging.getLogger(__name__)
 
+# SHAP columns are read straight into float32 (and displayed at float32
+# precision); feature values stay float64 so they print exactly as stored
+FLOAT32_PREFIXES = ('SHAP_',)
+# Narrowed to int32 after loading, when the column has no blanks
+INT32_COLUMNS = ('client_id', 'round_num')
+
+FL_KEYWORDS = (
+    'client', 'malicious', 'benign', 'detection', 'round', 'accuracy',
+    'loss', 'federated', 'learning', 'parameter', 'model', 'attack',
+    'poison', 'feature', 'shap', 'analysis', 'update', 'suspicious'
+)
+
+# One case-insensitive alternation scanned in C, instead of a Python
+# substring check per keyword
+_FL_KEYWORD_RE = re.compile("|".join(map(re.escape, FL_KEYWORDS)), re.IGNORECASE)
+
+# Pattern: "client 5", "client_id 5", "client#5"
+_CLIENT_ID_RE = re.compile(r'client[\s_#]*(\d+)', re.IGNORECASE)
+
 
 class SHAPCSVAnalyzer:
     """
@@ -36,6 +67,10 @@ class SHAPCSVAnalyzer:
         """Initialize with CSV path"""
         self.csv_path = csv_path
         self.df: Optional[pd.DataFrame] = None
+        self._shap_cols: List[str] = []
+        self._shap_features = np.empty(0, dtype=object)
+        self._shap_matrix = np.empty((0, 0))
+        self._latest_position: Dict[Any, int] = {}
         self._load_csv()
     
     def _load_csv(self):
@@ -46,7 +81,23 @@ class SHAPCSVAnalyzer:
             if not Path(self.csv_path).exists():
                 raise FileNotFoundError(f"CSV not found: {self.csv_path}")
             
-            self.df = pd.read_csv(self.csv_path)
+            self.df = self._read_frame(Path(self.csv_path))
+            
+            # SHAP columns and the feature each explains (name without the SHAP_ prefix)
+            self._shap_cols = [col for col in self.df.columns if col.startswith('SHAP_')]
+            self._shap_features = np.array(
+                [col.replace('SHAP_', '') for col in self._shap_cols],
+                dtype=object
+            )
+            self._shap_matrix = self.df[self._shap_cols].to_numpy(dtype=np.float64)
+            
+            # client_id -> position of that client's last row, so lookups skip a full scan
+            self._latest_position = {}
+            if 'client_id' in self.df.columns:
+                self._latest_position = {
+                    client_id: positions[-1]
+                    for client_id, positions in self.df.groupby('client_id', sort=False).indices.items()
+                }
             
             logger.info(f"✓ Loaded {len(self.df)} records, {len(self.df.columns)} columns")
             logger.info(f"✓ Available columns: {list(self.df.columns)[:10]}...")
@@ -55,6 +106,52 @@ class SHAPCSVAnalyzer:
             logger.error(f"Error loading CSV: {e}")
             raise
     
+    def _read_frame(self, csv_path: Path) -> pd.DataFrame:
+        """
+        Read the analysis table, via a Parquet sidecar when pyarrow is available.
+        
+        The first load parses the CSV and writes <name>.parquet next to it;
+        later loads memory-map that columnar copy as long as it is not
+        older than the CSV.
+        """
+        parquet_path = csv_path.with_suffix('.parquet')
+        if HAS_PYARROW and parquet_path.exists() \
+                and parquet_path.stat().st_mtime >= csv_path.stat().st_mtime:
+            try:
+                logger.info(f"Loading cached Parquet copy {parquet_path}")
+                return pd.read_parquet(parquet_path, engine='pyarrow', memory_map=True)
+            except Exception as e:
+                logger.warning(f"Unreadable Parquet cache {parquet_path}, re-reading CSV: {e}")
+        
+        # Peek at the header so the real read can parse the SHAP columns
+        # straight into float32 instead of float64 and downcasting afterwards
+        columns = pd.read_csv(csv_path, nrows=0).columns
+        dtype = {col: 'float32' for col in columns if col.startswith(FLOAT32_PREFIXES)}
+        
+        df = pd.read_csv(
+            csv_path,
+            dtype=dtype,
+            engine='pyarrow' if HAS_PYARROW else 'c'
+        )
+        
+        # Blank cells leave an id column as float64 with NaN; only narrow
+        # the ones that parsed as integers
+        for col in INT32_COLUMNS:
+            if col in df.columns and pd.api.types.is_integer_dtype(df[col]):
+                df[col] = df[col].astype('int32')
+        
+        if HAS_PYARROW:
+            # Write beside the target and rename, so a crash or concurrent
+            # reader never sees a truncated sidecar
+            tmp_path = parquet_path.with_name(parquet_path.name + '.part')
+            try:
+                df.to_parquet(tmp_path, engine='pyarrow', index=False)
+                os.replace(tmp_path, parquet_path)
+            except OSError as e:
+                logger.warning(f"Could not write Parquet cache {parquet_path}: {e}")
+        
+        return df
+    
     def get_top_shap_features_for_client(
         self,
         client_id: int,
@@ -80,61 +177,53 @@ class SHAPCSVAnalyzer:
                 logger.warning("No data loaded")
                 return None
             
-            # Filter for this client
-            client_data = self.df[self.df['client_id'] == client_id]
+            # Latest row for this client (last occurrence in the file)
+            position = self._latest_position.get(client_id)
             
-            if client_data.empty:
-                logger.warning(f"Client {client_id} not found in data")
+            if position is None:
+                logger.warning("Client %s not found in data", client_id)
                 return None
             
-            # Get the latest round for this client
-            latest_row = client_data.iloc[-1]
+            latest_row = self.df.iloc[position]
             
             # Extract key metrics
             round_num = int(latest_row['round_num'])
             accuracy = latest_row.get('main_task_accuracy')
             loss = latest_row.get('main_task_loss')
             
-            # Find all SHAP columns
-            shap_columns = [col for col in self.df.columns if col.startswith('SHAP_')]
-            
-            if not shap_columns:
-                logger.warning(f"No SHAP columns found in CSV")
+            if not self._shap_cols:
+                logger.warning("No SHAP columns found in CSV")
                 return None
             
-            # Extract SHAP values for this row
-            shap_values = {}
-            for shap_col in shap_columns:
-                val = latest_row[shap_col]
-                if pd.notna(val):
-                    # Get the corresponding feature column (without SHAP_ prefix)
-                    feature_col = shap_col.replace('SHAP_', '')
-                    shap_values[feature_col] = float(val)
+            # Extract all SHAP values for this row in one copy
+            row_shap = self._shap_matrix[position]
+            present = ~np.isnan(row_shap)
             
-            if not shap_values:
-                logger.warning(f"No SHAP values found for client {client_id}")
+            if not present.any():
+                logger.warning("No SHAP values found for client %s", client_id)
                 return None
             
-            # Sort by absolute value and get top N
-            sorted_features = sorted(
-                shap_values.items(),
-                key=lambda x: abs(x[1]),
-                reverse=True
-            )[:top_n]
+            # Top N by absolute value
+            feature_names = self._shap_features[present]
+            shap_vals = row_shap[present]
+            sorted_features = [
+                (feature_names[i], float(shap_vals[i]))
+                for i in top_k_desc(np.abs(shap_vals), top_n)
+            ]
             
             # Build natural language description
-            desc = f"**Client {client_id} - Round {round_num} Analysis**\n\n"
+            parts = [f"**Client {client_id} - Round {round_num} Analysis**\n\n"]
             
             # Add metrics
             if pd.notna(accuracy):
-                desc += f"Main task accuracy: {float(accuracy):.4f}\n"
+                parts.append(f"Main task accuracy: {float(accuracy):.4f}\n")
             if pd.notna(loss):
-                desc += f"Main task loss: {float(loss):.4f}\n"
+                parts.append(f"Main task loss: {float(loss):.4f}\n")
                 
             if "predicted_label" in self.df.columns:
-                desc += f"Predicted label: {latest_row['predicted_label']}\n"
+                parts.append(f"Predicted label: {latest_row['predicted_label']}\n")
 
-            desc += "\n**Top {n} Contributing Features (by SHAP value):**\n\n".format(n=min(top_n, len(sorted_features)))
+            parts.append(f"\n**Top {min(top_n, len(sorted_features))} Contributing Features (by SHAP value):**\n\n")
             
             # Add top features
             for idx, (feature_name, shap_val) in enumerate(sorted_features, 1):
@@ -147,17 +236,20 @@ class SHAPCSVAnalyzer:
                 else:
                     feat_val_str = "N/A"
                 
-                shap_val_str = self._format_value(shap_val)
+                # SHAP values are stored as float32
+                shap_val_str = fmt_float32(shap_val)
                 
-                desc += f"{idx}. **{feature_name}**\n"
-                desc += f"   - Feature value: {feat_val_str}\n"
-                desc += f"   - SHAP contribution: {shap_val_str}\n"
+                parts.append(
+                    f"{idx}. **{feature_name}**\n"
+                    f"   - Feature value: {feat_val_str}\n"
+                    f"   - SHAP contribution: {shap_val_str}\n"
+                )
             
-            logger.info(f"✓ Generated SHAP analysis for client {client_id}")
-            return desc
+            logger.info("✓ Generated SHAP analysis for client %s", client_id)
+            return "".join(parts)
             
         except Exception as e:
-            logger.error(f"Error getting SHAP features for client: {e}", exc_info=True)
+            logger.error("Error getting SHAP features for client: %s", e, exc_info=True)
             return None
     
     def _format_value(self, val: Any) -> str:
@@ -169,10 +261,7 @@ class SHAPCSVAnalyzer:
             return str(int(val))
         
         if isinstance(val, (float, np.floating)):
-            # Use scientific notation for very small or large values
-            if abs(val) < 0.0001 or abs(val) > 100000:
-                return f"{val:.2e}"
-            return f"{val:.6f}"
+            return fmt_float(float(val))
         
         return str(val)
     
@@ -199,7 +288,7 @@ class SHAPCSVAnalyzer:
         if client_id is not None:
             context = self.get_top_shap_features_for_client(client_id, top_n=5)
             if context:
-                logger.info(f"Got SHAP context for client {client_id}")
+                logger.info("Got SHAP context for client %s", client_id)
                 return context, True
             else:
                 return "Client data not found in SHAP analysis.", True
@@ -209,24 +298,11 @@ class SHAPCSVAnalyzer:
     
     def _is_fl_system_question(self, question: str) -> bool:
         """Detect if question is about FL system"""
-        fl_keywords = [
-            'client', 'malicious', 'benign', 'detection', 'round', 'accuracy',
-            'loss', 'federated', 'learning', 'parameter', 'model', 'attack',
-            'poison', 'feature', 'shap', 'analysis', 'update', 'suspicious'
-        ]
-        
-        question_lower = question.lower()
-        for keyword in fl_keywords:
-            if keyword in question_lower:
-                return True
-        
-        return False
+        return _FL_KEYWORD_RE.search(question) is not None
     
     def _extract_client_id(self, question: str) -> Optional[int]:
         """Extract client_id from question"""
-        import re
-        # Pattern: "client 5", "client_id 5", "client#5"
-        match = re.search(r'client[\s_#]*(\d+)', question, re.IGNORECASE)
+        match = _CLIENT_ID_RE.search(question)
         if match:
             return int(match.group(1))
         return None
@@ -259,6 +335,7 @@ class SHAPCSVAnalyzer:
 
 # Global instance
 _analyzer: Optional[SHAPCSVAnalyzer] = None
+_analyzer_lock = threading.Lock()
 
 
 def get_shap_csv_analyzer(csv_path: Optional[str] = None) -> SHAPCSVAnalyzer:
@@ -266,34 +343,39 @@ def get_shap_csv_analyzer(csv_path: Optional[str] = None) -> SHAPCSVAnalyzer:
     global _analyzer
     
     if _analyzer is None:
-        if csv_path is None:
-            # Try to find latest session's shap_analysis.csv
-            sessions_path = Path("../sessions")
-            if not sessions_path.exists():
-                sessions_path = Path("./sessions")
+        with _analyzer_lock:
+            if _analyzer is not None:
+                return _analyzer
             
-            if sessions_path.exists():
-                # Find most recent session
-                session_dirs = sorted(
-                    [d for d in sessions_path.iterdir() if d.is_dir()],
-                    reverse=True
-                )
+            if csv_path is None:
+                # Try to find latest session's shap_analysis.csv
+                sessions_path = Path("../sessions")
+                if not sessions_path.exists():
+                    sessions_path = Path("./sessions")
                 
-                if session_dirs:
-                    csv_path = session_dirs[0] / "shap_analysis.csv"
-                    if not csv_path.exists():
-                        raise FileNotFoundError(f"No shap_analysis.csv found in {session_dirs[0]}")
+                if sessions_path.exists():
+                    # Find most recent session
+                    session_dirs = sorted(
+                        [d for d in sessions_path.iterdir() if d.is_dir()],
+                        reverse=True
+                    )
+                    
+                    if session_dirs:
+                        csv_path = session_dirs[0] / "shap_analysis.csv"
+                        if not csv_path.exists():
+                            raise FileNotFoundError(f"No shap_analysis.csv found in {session_dirs[0]}")
+                    else:
+                        raise FileNotFoundError("No session directories found")
                 else:
-                    raise FileNotFoundError("No session directories found")
-            else:
-                raise FileNotFoundError("No sessions directory found")
+                    raise FileNotFoundError("No sessions directory found")
+            
+            _analyzer = SHAPCSVAnalyzer(str(csv_path))
         
-        _analyzer = SHAPCSVAnalyzer(str(csv_path))
-    
     return _analyzer
 
 
 def reset_analyzer():
     """Reset the global analyzer instance"""
     global _analyzer
-    _analyzer = None
+    with _analyzer_lock:
+        _analyzer = None
@@ -1,12 +1,14 @@
 """FastAPI Application Entry Point"""
+import asyncio
 import logging
 from fastapi import FastAPI
 from fastapi.staticfiles import StaticFiles
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse
 from pathlib import Path
 
 from chatbot_app.api.routes import router
-from chatbot_app.config import HOST, PORT, DEBUG
+from chatbot_app.config import HOST, PORT, DEBUG, ALLOWED_ORIGINS
 
 # Setup logging
 logging.basicConfig(
@@ -19,13 +21,14 @@ logger = logging.getLogger(__name__)
 app = FastAPI(
     title="AI Chatbot API",
     description="Production-ready FastAPI + LangChain chatbot",
-    version="1.0.0"
+    version="1.0.0",
+    default_response_class=ORJSONResponse
 )
 
 # Add CORS middleware
 app.add_middleware(
     CORSMiddleware,
-    allow_origins=["*"],
+    allow_origins=ALLOWED_ORIGINS,  # Explicit list: credentials can't be used with "*"
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
@@ -46,12 +49,9 @@ if frontend_path.exists():
         return FileResponse(frontend_path / "index.html")
 
 
-@app.on_event("startup")
-async def startup_event():
-    """Initialize agent and data analyzers on startup"""
-    logger.info("Application starting up...")
+def _load_agent():
+    """Initialize the CSV/JSON Q&A agent (loads LLM + data sources)"""
     try:
-        # Initialize CSV/JSON Q&A agent (loads LLM + data sources)
         from chatbot_app.llm.agent import get_agent
         agent = get_agent()
         logger.info("✓ CSV/JSON Q&A agent initialized")
@@ -68,11 +68,22 @@ async def startup_event():
             logger.warning("⚠ No data source available (JSON and CSV both unavailable)")
         
         logger.info("✓ Chatbot ready - can answer questions about the detection system")
+        return agent
     except Exception as e:
         logger.error(f"✗ Failed to initialize: {str(e)}")
         raise
 
 
+@app.on_event("startup")
+async def startup_event():
+    """Start loading the agent and data analyzers in the background"""
+    logger.info("Application starting up...")
+    # Model load takes seconds; run it in a worker thread so the server
+    # accepts connections (and /api/health answers 503) meanwhile.
+    # Routes await this future before using the agent.
+    app.state.agent_future = asyncio.get_running_loop().run_in_executor(None, _load_agent)
+
+
 @app.on_event("shutdown")
 async def shutdown_event():
     """Cleanup on shutdown"""
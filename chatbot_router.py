@@ -8,6 +8,7 @@ Routes are mounted at /api/chatbot/* prefix in the main application.
 import logging
 from typing import List
 from fastapi import APIRouter, HTTPException
+from fastapi.concurrency import run_in_threadpool
 from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 
@@ -70,7 +71,8 @@ async def chat(request: ChatRequest) -> ChatResponse:
         history = [{"role": msg.role, "content": msg.content} for msg in request.chat_history]
         
         # Process through agent (analyzes CSV/JSON + LLM)
-        response = agent.process(request.message, history)
+        # Run in a worker thread so concurrent requests reach the model together
+        response = await run_in_threadpool(agent.process, request.message, history)
         
         logger.info(f"Chatbot: '{request.message}' → {len(response)} chars response")
         return ChatResponse(response=response)
@@ -94,7 +96,9 @@ async def stream(message: str):
     Returns:
         StreamingResponse with SSE-formatted token stream
     """
-    async def event_generator():
+    # Sync generator: StreamingResponse iterates it in a worker thread,
+    # keeping blocking generation off the event loop
+    def event_generator():
         try:
             from chatbot_app.llm.agent import get_agent
             
@@ -1,5 +1,6 @@
 from pydantic_settings import BaseSettings
 from functools import lru_cache
+from typing import List
 
 
 class Settings(BaseSettings):
@@ -8,13 +9,32 @@ class Settings(BaseSettings):
     aws_secret_access_key: str
     aws_region: str = "us-east-1"
     s3_bucket_name: str
+    s3_max_pool: int = 64  # botocore connection pool size for the shared S3 client
+    s3_max_concurrency: int = 64  # in-flight S3 requests before callers queue
+    s3_cache_max_bytes: int = 64 * 1024 * 1024  # ETag-validated object cache budget
     
     # Database
     database_url: str
+    db_pool_size: int = 10
+    db_max_overflow: int = 5
+    db_pool_recycle: int = 60  # seconds; recycle before PgBouncer/server idle timeouts
+    db_pool_timeout: int = 30
+    db_pool_pre_ping: bool = False  # enable behind PgBouncer session mode
     redis_url: str
+    redis_max_connections: int = 20  # bounded pool shared by all requests
+    redis_socket_timeout: float = 2.0
+    redis_connect_timeout: float = 1.0
     
     # Security
     lambda_secret_key: str
+    # Comma-separated browser origins allowed by CORS, e.g.
+    # ALLOWED_ORIGINS=https://dashboard.example.com,http://localhost:3000
+    # (same format as the chatbot app's ALLOWED_ORIGINS)
+    allowed_origins: str = "http://localhost:3000"
+    
+    @property
+    def allowed_origin_list(self) -> List[str]:
+        return [origin.strip() for origin in self.allowed_origins.split(",") if origin.strip()]
     
     class Config:
         env_file = ".env"
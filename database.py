@@ -1,6 +1,9 @@
 from sqlalchemy import create_engine, Column, Integer, String, DateTime, JSON, Text
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.pool import QueuePool
+from contextlib import asynccontextmanager
 from datetime import datetime
 from config import get_settings
 import redis.asyncio as redis
@@ -8,8 +11,55 @@ import redis.asyncio as redis
 settings = get_settings()
 
 # PostgreSQL setup
-engine = create_engine(settings.database_url)
+if settings.database_url.startswith("sqlite"):
+    # Local development database; SQLite keeps SQLAlchemy's default pooling
+    engine = create_engine(settings.database_url)
+else:
+    # Persistent pool sized for PgBouncer transaction mode: connections are
+    # reused across requests instead of churning a new one per query
+    engine = create_engine(
+        settings.database_url,
+        poolclass=QueuePool,
+        pool_size=settings.db_pool_size,
+        max_overflow=settings.db_max_overflow,
+        pool_recycle=settings.db_pool_recycle,
+        pool_timeout=settings.db_pool_timeout,
+        pool_pre_ping=settings.db_pool_pre_ping
+    )
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+
+def _async_url(url: str) -> str:
+    """Point a sync database URL at its asyncio driver"""
+    for sync_prefix, async_prefix in (
+        ("postgresql://", "postgresql+asyncpg://"),
+        ("postgres://", "postgresql+asyncpg://"),
+        ("sqlite://", "sqlite+aiosqlite://"),
+    ):
+        if url.startswith(sync_prefix):
+            return async_prefix + url[len(sync_prefix):]
+    return url
+
+
+# Async engine for routes that must not block the event loop on DB I/O
+if settings.database_url.startswith("sqlite"):
+    async_engine = create_async_engine(_async_url(settings.database_url))
+else:
+    async_engine = create_async_engine(
+        _async_url(settings.database_url),
+        pool_size=settings.db_pool_size,
+        max_overflow=settings.db_max_overflow,
+        pool_recycle=settings.db_pool_recycle,
+        pool_timeout=settings.db_pool_timeout,
+        pool_pre_ping=settings.db_pool_pre_ping
+    )
+AsyncSessionLocal = async_sessionmaker(async_engine, expire_on_commit=False)
+
+# INSERT construct of the configured dialect, for INSERT ... ON CONFLICT
+if settings.database_url.startswith("sqlite"):
+    from sqlalchemy.dialects.sqlite import insert as dialect_insert
+else:
+    from sqlalchemy.dialects.postgresql import insert as dialect_insert
 Base = declarative_base()
 
 
@@ -17,17 +67,33 @@ Base = declarative_base()
 class RedisClient:
     def __init__(self):
         self.redis = None
+        self.pool = None
     
     async def connect(self):
-        self.redis = await redis.from_url(
+        # Bounded pool with fail-fast timeouts; redis-py picks the hiredis
+        # C parser automatically when it is installed (redis[hiredis])
+        self.pool = redis.ConnectionPool.from_url(
             settings.redis_url,
+            max_connections=settings.redis_max_connections,
+            socket_timeout=settings.redis_socket_timeout,
+            socket_connect_timeout=settings.redis_connect_timeout,
             encoding="utf-8",
             decode_responses=True
         )
+        self.redis = redis.Redis(connection_pool=self.pool)
     
     async def disconnect(self):
         if self.redis:
             await self.redis.close()
+        if self.pool:
+            await self.pool.disconnect()
+    
+    @asynccontextmanager
+    async def pipeline(self, transaction: bool = False):
+        """Queue several commands and send them in one round-trip on exit"""
+        async with self.redis.pipeline(transaction=transaction) as pipe:
+            yield pipe
+            await pipe.execute()
     
     async def set(self, key: str, value: str, expiration: int = None):
         if expiration:
@@ -114,5 +180,10 @@ def get_db():
         db.close()
 
 
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+
 def init_db():
     Base.metadata.create_all(bind=engine)
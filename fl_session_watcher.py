@@ -1,50 +1,132 @@
 import os
 import json
 import asyncio
+import bisect
+import fnmatch
+import re
+import threading
+import time
 from pathlib import Path
-from typing import Dict, Any, Optional
+from typing import Dict, Any, List, Optional
 from datetime import datetime
 from watchdog.observers import Observer
 from watchdog.events import FileSystemEventHandler, FileCreatedEvent, FileModifiedEvent
 
+import json_utils
+from response_cache import round_responses
+
+
+def _read_json(file_path) -> Any:
+    """Parse a JSON file (orjson, stdlib fallback for NaN literals)"""
+    # Read into bytes rather than mmap: writers under sessions/ rewrite files
+    # in place, and truncating a mapped file mid-parse raises SIGBUS
+    with open(file_path, 'rb') as f:
+        return json_utils.loads(f.read())
+
+
+# "round_" inside the last path component, i.e. 'round_' in basename(path)
+_ROUND_NAME_RE = re.compile(r'round_[^/\\]*$')
+
+# Quiet period after the last event for a round file before it is read and
+# broadcast; folds watchdog's created -> modified -> modified bursts into one
+DEBOUNCE_SECONDS = 0.5
+
 
 class SessionFileHandler(FileSystemEventHandler):
     """Handles file system events for FL session files"""
     
-    def __init__(self, websocket_manager, callback=None):
+    def __init__(self, websocket_manager, callback=None, index=None, loop=None):
         self.manager = websocket_manager
         self.callback = callback
-        self.processed_files = set()
+        self.index = index  # FLSessionWatcher whose session/round index tracks these events
+        self.loop = loop  # Event loop the broadcasts run on
+        # Round file path -> (pending timer, event type); only touched on the loop thread
+        self._pending: Dict[str, tuple] = {}
         self.current_session = None
     
     def on_created(self, event):
+        if self.index:
+            self.index._index_add(event.src_path, event.is_directory)
+            self.index._invalidate_round(event.src_path)
+        
         if event.is_directory:
             return
         
         if self._is_round_file(event.src_path):
-            asyncio.create_task(self._process_file(event.src_path, 'created'))
+            self._schedule_round(event.src_path, 'created')
         elif event.src_path.endswith('summary.json'):
-            asyncio.create_task(self._process_summary(event.src_path))
+            # Called on watchdog's observer thread, which has no event loop
+            asyncio.run_coroutine_threadsafe(self._process_summary(event.src_path), self.loop)
     
     def on_modified(self, event):
         if event.is_directory:
             return
         
+        if self.index:
+            self.index._invalidate_round(event.src_path)
+        
         if self._is_round_file(event.src_path):
-            asyncio.create_task(self._process_file(event.src_path, 'modified'))
+            self._schedule_round(event.src_path, 'modified')
+    
+    def on_deleted(self, event):
+        if self.index:
+            self.index._index_remove(event.src_path, event.is_directory)
+            self.index._invalidate_round(event.src_path)
+    
+    def on_moved(self, event):
+        # Atomic writes land as a rename (round_NNN.json.tmp -> round_NNN.json)
+        if self.index:
+            self.index._index_remove(event.src_path, event.is_directory)
+            self.index._invalidate_round(event.src_path)
+            if event.is_directory:
+                # Files inside a moved directory get no events of their own
+                self.index._build_index()
+            else:
+                self.index._index_add(event.dest_path, False)
+                self.index._invalidate_round(event.dest_path)
+        
+        if event.is_directory:
+            return
+        
+        if self._is_round_file(event.dest_path):
+            self._schedule_round(event.dest_path, 'created')
+        elif event.dest_path.endswith('summary.json'):
+            asyncio.run_coroutine_threadsafe(self._process_summary(event.dest_path), self.loop)
+    
+    def _schedule_round(self, file_path: str, event_type: str):
+        """Hand a round file event from the observer thread to the loop for debouncing"""
+        self.loop.call_soon_threadsafe(self._debounce, file_path, event_type)
+    
+    def _debounce(self, file_path: str, event_type: str):
+        """(Re)start the quiet-period timer for a round file"""
+        pending = self._pending.get(file_path)
+        if pending is not None:
+            timer, first_event = pending
+            timer.cancel()
+            # A file created during the burst is reported as created
+            if first_event == 'created':
+                event_type = first_event
+        timer = self.loop.call_later(DEBOUNCE_SECONDS, self._fire, file_path, event_type)
+        self._pending[file_path] = (timer, event_type)
+    
+    def _fire(self, file_path: str, event_type: str):
+        """Quiet period elapsed: process and broadcast the round once"""
+        self._pending.pop(file_path, None)
+        if self.index:
+            # Drop anything a request cached from a half-written file meanwhile
+            self.index._invalidate_round(file_path)
+        asyncio.create_task(self._process_file(file_path, event_type))
     
     def _is_round_file(self, file_path: str) -> bool:
         """Check if file is a round JSON file"""
-        return file_path.endswith('.json') and 'round_' in os.path.basename(file_path)
+        # endswith rejects temp/log files before the regex runs
+        return file_path.endswith('.json') and _ROUND_NAME_RE.search(file_path) is not None
     
     async def _process_file(self, file_path: str, event_type: str):
         """Process round file and broadcast data"""
         try:
-            # Wait for file to be fully written
-            await asyncio.sleep(0.5)
-            
-            with open(file_path, 'r') as f:
-                round_data = json.load(f)
+            # Read and parse off the event loop so broadcasts keep flowing
+            round_data = await asyncio.to_thread(_read_json, file_path)
             
             # Extract session info
             session_id = round_data.get('metadata', {}).get('sessionId')
@@ -79,8 +161,7 @@ class SessionFileHandler(FileSystemEventHandler):
         try:
             await asyncio.sleep(0.5)
             
-            with open(file_path, 'r') as f:
-                summary_data = json.load(f)
+            summary_data = await asyncio.to_thread(_read_json, file_path)
             
             message = {
                 "type": "TRAINING_COMPLETE",
@@ -104,6 +185,18 @@ class FLSessionWatcher:
         self.observer = None
         self.handler = None
         self.active = False
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        
+        # In-memory view of the sessions directory, kept current from watchdog
+        # events so the session endpoints don't rescan the disk per request.
+        # Mutated from the observer thread and read from request handlers.
+        self._index_lock = threading.Lock()
+        # Watched paths arrive as strings under this prefix; compared once per
+        # event instead of building Path objects
+        self._sessions_prefix = os.path.join(str(self.sessions_path), '')
+        self._indexed = False
+        self._sessions: Dict[str, List[str]] = {}  # session id -> sorted round file names
+        self._session_activity: Dict[str, float] = {}  # session id -> last change time
     
     async def start(self):
         """Start watching the sessions directory"""
@@ -114,8 +207,12 @@ class FLSessionWatcher:
         # Ensure sessions directory exists
         self.sessions_path.mkdir(parents=True, exist_ok=True)
         
+        self._build_index()
+        
         # Create handler and observer
-        self.handler = SessionFileHandler(self.manager)
+        # Watchdog callbacks run on the observer thread; they hand work back to this loop
+        self._loop = asyncio.get_running_loop()
+        self.handler = SessionFileHandler(self.manager, index=self, loop=self._loop)
         self.observer = Observer()
         self.observer.schedule(self.handler, str(self.sessions_path), recursive=True)
         
@@ -135,45 +232,117 @@ class FLSessionWatcher:
             self.active = False
             print("✓ FL Session Watcher stopped")
     
-    def get_latest_session(self) -> Optional[str]:
-        """Get the most recent session directory"""
+    def _build_index(self):
+        """Walk the sessions directory once to seed the in-memory index"""
+        sessions: Dict[str, List[str]] = {}
+        activity: Dict[str, float] = {}
         try:
-            sessions = [d for d in self.sessions_path.iterdir() if d.is_dir()]
-            if not sessions:
-                return None
-            return str(max(sessions, key=lambda x: x.stat().st_mtime))
+            for session_dir in self.sessions_path.iterdir():
+                if not session_dir.is_dir():
+                    continue
+                rounds_dir = session_dir / "rounds"
+                sessions[session_dir.name] = sorted(
+                    f.name for f in rounds_dir.glob("round_*.json")
+                ) if rounds_dir.is_dir() else []
+                activity[session_dir.name] = session_dir.stat().st_mtime
         except Exception as e:
-            print(f"Error getting latest session: {e}")
+            print(f"Error indexing sessions: {e}")
+        
+        with self._index_lock:
+            self._sessions = sessions
+            self._session_activity = activity
+            self._indexed = True
+    
+    def _ensure_index(self):
+        if not self._indexed:
+            self._build_index()
+    
+    def _session_of(self, path: str) -> Optional[tuple]:
+        """Split a watched path into (session id, path parts below the session dir)"""
+        if not path.startswith(self._sessions_prefix):
             return None
+        parts = tuple(p for p in path[len(self._sessions_prefix):].split(os.sep) if p)
+        return (parts[0], parts[1:]) if parts else None
+    
+    @staticmethod
+    def _is_indexed_round(rest: tuple) -> bool:
+        return len(rest) == 2 and rest[0] == "rounds" and fnmatch.fnmatch(rest[1], "round_*.json")
+    
+    def _index_add(self, path: str, is_directory: bool):
+        """Record a created file or directory (called from the observer thread)"""
+        located = self._session_of(path)
+        if located is None:
+            return
+        session_id, rest = located
+        if not rest and not is_directory:
+            return  # a plain file directly under sessions/
+        
+        with self._index_lock:
+            rounds = self._sessions.setdefault(session_id, [])
+            self._session_activity[session_id] = time.time()
+            if not is_directory and self._is_indexed_round(rest):
+                name = rest[1]
+                i = bisect.bisect_left(rounds, name)
+                if i == len(rounds) or rounds[i] != name:
+                    rounds.insert(i, name)
+    
+    def _index_remove(self, path: str, is_directory: bool):
+        """Forget a deleted file or directory (called from the observer thread)"""
+        located = self._session_of(path)
+        if located is None:
+            return
+        session_id, rest = located
+        
+        with self._index_lock:
+            if not rest:
+                self._sessions.pop(session_id, None)
+                self._session_activity.pop(session_id, None)
+                return
+            rounds = self._sessions.get(session_id)
+            if rounds is None:
+                return
+            if rest == ("rounds",):
+                rounds.clear()
+            elif self._is_indexed_round(rest):
+                i = bisect.bisect_left(rounds, rest[1])
+                if i < len(rounds) and rounds[i] == rest[1]:
+                    del rounds[i]
+            self._session_activity[session_id] = time.time()
+    
+    def _invalidate_round(self, path: str):
+        """Drop the cached /api/sessions round response for a changed round file"""
+        located = self._session_of(path)
+        if located is not None:
+            session_id, rest = located
+            if len(rest) == 2 and rest[0] == "rounds":
+                round_responses.invalidate(("fs", session_id, rest[1]))
+    
+    def get_latest_session(self) -> Optional[str]:
+        """Get the most recent session directory"""
+        self._ensure_index()
+        with self._index_lock:
+            if not self._session_activity:
+                return None
+            latest = max(self._session_activity, key=self._session_activity.__getitem__)
+        return str(self.sessions_path / latest)
     
     def get_all_sessions(self) -> list:
         """Get all session directories"""
-        try:
-            sessions = [d.name for d in self.sessions_path.iterdir() if d.is_dir()]
-            return sorted(sessions, reverse=True)
-        except Exception as e:
-            print(f"Error getting sessions: {e}")
-            return []
+        self._ensure_index()
+        with self._index_lock:
+            return sorted(self._sessions, reverse=True)
     
     def get_session_rounds(self, session_id: str) -> list:
         """Get all round files for a specific session"""
-        try:
-            session_path = self.sessions_path / session_id / "rounds"
-            if not session_path.exists():
-                return []
-            
-            rounds = sorted([f.name for f in session_path.glob("round_*.json")])
-            return rounds
-        except Exception as e:
-            print(f"Error getting rounds for session {session_id}: {e}")
-            return []
+        self._ensure_index()
+        with self._index_lock:
+            return list(self._sessions.get(session_id, ()))
     
     def load_round_data(self, session_id: str, round_file: str) -> Optional[Dict[str, Any]]:
         """Load data from a specific round file"""
         try:
             file_path = self.sessions_path / session_id / "rounds" / round_file
-            with open(file_path, 'r') as f:
-                return json.load(f)
+            return _read_json(file_path)
         except Exception as e:
             print(f"Error loading round data: {e}")
             return None
@@ -184,8 +353,7 @@ class FLSessionWatcher:
             file_path = self.sessions_path / session_id / "summary.json"
             if not file_path.exists():
                 return None
-            with open(file_path, 'r') as f:
-                return json.load(f)
+            return _read_json(file_path)
         except Exception as e:
             print(f"Error loading session summary: {e}")
             return None
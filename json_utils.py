@@ -0,0 +1,34 @@
+"""
+JSON helpers backed by orjson
+
+orjson parses several times faster than the stdlib, but rejects the
+NaN/Infinity literals that Python's json module writes for float('nan').
+FL round dumps can contain those, so parsing falls back to the stdlib
+when orjson refuses the input. Serializing always goes through orjson,
+which writes NaN/Infinity as null.
+"""
+
+import json
+from typing import Any, Union
+
+import orjson
+
+
+def loads(data: Union[bytes, bytearray, memoryview, str]) -> Any:
+    """Parse JSON, raising json.JSONDecodeError on invalid input"""
+    try:
+        return orjson.loads(data)
+    except orjson.JSONDecodeError:
+        if isinstance(data, (bytes, bytearray, memoryview)):
+            data = bytes(data).decode('utf-8')
+        return json.loads(data)
+
+
+def dumps(obj: Any) -> bytes:
+    """Serialize to compact UTF-8 JSON bytes"""
+    return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS)
+
+
+def dumps_text(obj: Any) -> str:
+    """Serialize to compact JSON text, e.g. for a WebSocket text frame"""
+    return dumps(obj).decode('utf-8')
@@ -1,8 +1,29 @@
 import json
 import boto3
 import os
+import urllib3
 from datetime import datetime
 
+try:
+    # orjson emits bytes directly; only present if bundled with the function
+    import orjson
+
+    def _dumps_bytes(payload) -> bytes:
+        return orjson.dumps(payload)
+except ImportError:
+    def _dumps_bytes(payload) -> bytes:
+        return json.dumps(payload).encode('utf-8')
+
+
+# Module scope so warm invocations (and every record in one event) reuse
+# keep-alive connections to the webhook instead of a new TCP+TLS handshake
+_HTTP = urllib3.PoolManager(
+    num_pools=2,
+    maxsize=8,
+    retries=urllib3.Retry(total=2, backoff_factor=0.1)
+)
+_HEADERS = {'Content-Type': 'application/json'}
+
 
 def lambda_handler(event, context):
     """
@@ -15,17 +36,23 @@ def lambda_handler(event, context):
     LAMBDA_SECRET_KEY = os.environ.get('LAMBDA_SECRET_KEY')
     
     try:
-        # Parse S3 event
+        # Parse S3 event; all records go to FastAPI in one POST
+        payloads = []
+        # Fallback for records without an eventTime, taken once per invocation
+        invocation_ts = None
         for record in event.get('Records', []):
             event_name = record.get('eventName', '')
             s3_info = record.get('s3', {})
             bucket = s3_info.get('bucket', {}).get('name', '')
             s3_key = s3_info.get('object', {}).get('key', '')
             size = s3_info.get('object', {}).get('size', 0)
-            event_time = record.get('eventTime', datetime.utcnow().isoformat())
+            event_time = record.get('eventTime')
+            if event_time is None:
+                if invocation_ts is None:
+                    invocation_ts = datetime.utcnow().isoformat()
+                event_time = invocation_ts
             
-            # Create payload
-            payload = {
+            payloads.append({
                 'event_id': f"{bucket}_{s3_key}_{event_time}",
                 'bucket': bucket,
                 'key': s3_key,
@@ -36,22 +63,19 @@ def lambda_handler(event, context):
                 'metadata': {
                     'region': record.get('awsRegion', ''),
                     'source_ip': record.get('requestParameters', {}).get('sourceIPAddress', '')
-                },
-                'secret_key': LAMBDA_SECRET_KEY
-            }
-            
+                }
+            })
+        
+        if payloads:
             # Send to FastAPI
-            import urllib3
-            http = urllib3.PoolManager()
-            
-            response = http.request(
+            response = _HTTP.request(
                 'POST',
                 FASTAPI_WEBHOOK_URL,
-                body=json.dumps(payload).encode('utf-8'),
-                headers={'Content-Type': 'application/json'}
+                body=_dumps_bytes({'batch': payloads, 'secret_key': LAMBDA_SECRET_KEY}),
+                headers=_HEADERS
             )
             
-            print(f"Sent to FastAPI: {response.status}")
+            print(f"Sent {len(payloads)} record(s) to FastAPI: {response.status}")
             print(f"Response: {response.data.decode('utf-8')}")
         
         return {
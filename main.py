@@ -1,18 +1,23 @@
-from fastapi import FastAPI, HTTPException, Depends, WebSocket, WebSocketDisconnect, Header
+from fastapi import FastAPI, HTTPException, Depends, WebSocket, WebSocketDisconnect, Header, Response
 from fastapi.middleware.cors import CORSMiddleware
-from sqlalchemy.orm import Session
-from typing import Optional, List
+from fastapi.responses import ORJSONResponse
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Optional, List, Union
+import asyncio
 import logging
 import json
 import os
+from collections import OrderedDict
 from datetime import datetime
 
 from config import get_settings
-from database import get_db, init_db, redis_client, S3Event, FileContent
-from schemas import LambdaPayload, WebSocketMessage, FileDownloadRequest, EventResponse
+from database import get_async_db, init_db, redis_client, dialect_insert, S3Event, FileContent
+from schemas import LambdaEventRecord, LambdaPayload, LambdaBatchPayload, WebSocketMessage, FileDownloadRequest, EventResponse
 from aws_client import s3_client
 from websocket_manager import manager
 from fl_session_watcher import FLSessionWatcher
+from response_cache import round_responses
 from s3_fl_processor import S3FLFileProcessor
 from chatbot_router import router as chatbot_router
 
@@ -24,12 +29,39 @@ logger = logging.getLogger(__name__)
 settings = get_settings()
 
 # FastAPI app
-app = FastAPI(title="S3 Event Processing API", version="1.0.0")
+app = FastAPI(
+    title="S3 Event Processing API",
+    version="1.0.0",
+    default_response_class=ORJSONResponse
+)
 
 # FL Session Watcher
 fl_watcher = None
 
 
+# Current UTC time as ISO strings at 1-second resolution, refreshed by
+# _tick_clock() instead of formatting datetime.utcnow() for every response
+# and WebSocket message
+_NOW_ISO = ""
+_NOW_ISO_Z = ""
+_clock_task = None
+
+
+def _refresh_clock():
+    global _NOW_ISO, _NOW_ISO_Z
+    _NOW_ISO = datetime.utcnow().isoformat(timespec="seconds")
+    _NOW_ISO_Z = _NOW_ISO + "Z"
+
+
+_refresh_clock()
+
+
+async def _tick_clock():
+    while True:
+        await asyncio.sleep(1)
+        _refresh_clock()
+
+
 # ============================================================================
 # DATA TRANSFORMATION ADAPTERS
 # ============================================================================
@@ -39,6 +71,18 @@ def normalize_value(value, default=0.0):
     return default if value is None else float(value)
 
 
+def mean_client_accuracy(clients):
+    """Mean accuracy over clients that report one, 0.0 if none do (single pass)."""
+    total = 0.0
+    count = 0
+    for c in clients:
+        accuracy = c.get("accuracy")
+        if accuracy is not None:
+            total += accuracy
+            count += 1
+    return total / count if count else 0.0
+
+
 def transform_to_global_metrics(round_data):
     """Transform round JSON to GlobalMetrics format."""
     metadata = round_data.get("metadata", {})
@@ -49,9 +93,7 @@ def transform_to_global_metrics(round_data):
     accuracy = global_metrics.get("accuracy") or round_summary.get("accuracy")
     if accuracy is None:
         # Compute from active clients
-        clients = round_data.get("clients", [])
-        active = [c for c in clients if c.get("accuracy") is not None]
-        accuracy = sum(c["accuracy"] for c in active) / len(active) if active else 0.0
+        accuracy = mean_client_accuracy(round_data.get("clients", []))
     
     accuracy_percent = normalize_value(accuracy) * 100
     loss = global_metrics.get("loss") or round_summary.get("loss")
@@ -64,16 +106,47 @@ def transform_to_global_metrics(round_data):
         "activeMaliciousClients": global_metrics.get("activeMaliciousClients", 0),
         "defenseSuccessRate": round(normalize_value(global_metrics.get("defenseSuccessRate")), 2),
         "isConnected": True,
-        "timestamp": metadata.get("timestamp", datetime.utcnow().isoformat() + "Z")
+        "timestamp": metadata.get("timestamp", _NOW_ISO_Z)
     }
 
+# Rounds are immutable once written, so their GlobalMetrics are memoized.
+# Keyed by (source key, round, round timestamp): a re-written round carries a
+# new timestamp and misses instead of serving stale metrics. Rounds without a
+# timestamp are not cached, as their fallback timestamp is the current time.
+# FIFO eviction; the latest rounds are the ones requested.
+GLOBAL_METRICS_CACHE_SIZE = 512
+_global_metrics_cache: "OrderedDict[tuple, dict]" = OrderedDict()
+
+
+def cached_global_metrics(source_key: str, round_data) -> dict:
+    """transform_to_global_metrics, memoized per round of a summary source."""
+    metadata = round_data.get("metadata", {})
+    if metadata.get("timestamp") is None:
+        return transform_to_global_metrics(round_data)
+    key = (source_key, metadata.get("round"), metadata["timestamp"])
+    metrics = _global_metrics_cache.get(key)
+    if metrics is None:
+        metrics = transform_to_global_metrics(round_data)
+        _global_metrics_cache[key] = metrics
+        if len(_global_metrics_cache) > GLOBAL_METRICS_CACHE_SIZE:
+            _global_metrics_cache.popitem(last=False)
+    return metrics
+
+async def _latest_summary_file(db: AsyncSession) -> Optional[FileContent]:
+    """Most recently stored session summary.json, or None"""
+    return (await db.execute(
+        select(FileContent).where(
+            FileContent.s3_key.like("%summary.json")
+        ).order_by(FileContent.stored_at.desc()).limit(1)
+    )).scalars().first()
+
 # S3 FL File Processor
 s3_processor = None
 
 # CORS middleware
 app.add_middleware(
     CORSMiddleware,
-    allow_origins=["*"],  # Configure this for production
+    allow_origins=settings.allowed_origin_list,
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
@@ -86,9 +159,12 @@ app.include_router(chatbot_router, prefix="/api")
 @app.on_event("startup")
 async def startup_event():
     """Initialize database and Redis on startup"""
-    global fl_watcher, s3_processor
+    global fl_watcher, s3_processor, _clock_task
     logger.info("Starting up application...")
+    _refresh_clock()
+    _clock_task = asyncio.create_task(_tick_clock())
     init_db()
+    await s3_client.startup()
     try:
         await redis_client.connect()
         logger.info("Redis connected successfully")
@@ -112,11 +188,15 @@ async def shutdown_event():
     """Cleanup on shutdown"""
     global fl_watcher
     logger.info("Shutting down application...")
+    if _clock_task:
+        _clock_task.cancel()
     try:
         await redis_client.disconnect()
     except Exception as e:
         logger.warning(f"Redis disconnect error: {e}")
     
+    await s3_client.shutdown()
+    
     # Stop FL Session Watcher
     if fl_watcher:
         fl_watcher.stop()
@@ -136,14 +216,82 @@ def root():
     }
 
 
+async def _handle_lambda_event(payload: LambdaEventRecord, db: AsyncSession):
+    """Store, cache, broadcast and process one S3 event forwarded by Lambda"""
+    event_time = payload.event_time.isoformat()
+    
+    # Insert unless the event already exists (Lambda may send duplicates):
+    # one round trip, and the unique event_id index settles concurrent retries
+    result = await db.execute(
+        dialect_insert(S3Event).values(
+            event_id=payload.event_id,
+            bucket=payload.bucket,
+            key=payload.key,
+            event_name=payload.event_name,
+            event_time=payload.event_time,
+            file_size=payload.size,
+            content_type=payload.content_type,
+            event_metadata=payload.metadata,
+            processed=0
+        ).on_conflict_do_nothing(index_elements=["event_id"])
+    )
+    await db.commit()
+    if result.rowcount == 0:
+        logger.info(f"Event {payload.event_id} already exists, skipping duplicate")
+    
+    # Store in Redis for quick access (optional)
+    try:
+        await redis_client.set(
+            f"event:{payload.event_id}",
+            json.dumps({
+                "bucket": payload.bucket,
+                "key": payload.key,
+                "event_name": payload.event_name,
+                "timestamp": event_time
+            }),
+            expiration=3600  # 1 hour
+        )
+    except Exception as redis_error:
+        logger.warning(f"Redis not available: {redis_error}")
+    
+    # Broadcast initial S3 event notification
+    ws_message = {
+        "type": "s3_upload_detected",
+        "event_id": payload.event_id,
+        "bucket": payload.bucket,
+        "key": payload.key,
+        "event_name": payload.event_name,
+        "timestamp": event_time,
+        "size": payload.size,
+        "content_type": payload.content_type,
+        "data": payload.metadata
+    }
+    await manager.broadcast(ws_message)
+    
+    # Process FL session file if applicable (wait for download to complete)
+    if s3_processor:
+        event_data = {
+            "event_id": payload.event_id,
+            "bucket": payload.bucket,
+            "key": payload.key,
+            "event_name": payload.event_name,
+            "event_time": event_time
+        }
+        # Process synchronously - wait for download and processing to complete
+        await s3_processor.process_s3_event(event_data, db)
+    
+    logger.info(f"Event {payload.event_id} processed and broadcasted")
+
+
 @app.post("/webhook/lambda")
 async def lambda_webhook(
-    payload: LambdaPayload,
-    db: Session = Depends(get_db)
+    payload: Union[LambdaBatchPayload, LambdaPayload],
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Endpoint for Lambda to POST S3 event data
-    Lambda should send small JSON payload about the S3 event
+    Lambda sends every record of an S3 notification in one batch payload
+    (single-record payloads are still accepted)
     Automatically downloads, stores, and broadcasts FL session files
     """
     # Verify secret key
@@ -151,74 +299,15 @@ async def lambda_webhook(
         logger.warning(f"Unauthorized webhook attempt with invalid secret")
         raise HTTPException(status_code=401, detail="Unauthorized")
     
-    logger.info(f"Received Lambda webhook for event: {payload.event_id}")
-    
-    try:
-        # Check if event already exists (Lambda may send duplicates)
-        existing_event = db.query(S3Event).filter(S3Event.event_id == payload.event_id).first()
-        
-        if existing_event:
-            logger.info(f"Event {payload.event_id} already exists, skipping duplicate")
-            db_event = existing_event
-        else:
-            # Store new event in database
-            db_event = S3Event(
-                event_id=payload.event_id,
-                bucket=payload.bucket,
-                key=payload.key,
-                event_name=payload.event_name,
-                event_time=datetime.fromisoformat(payload.event_time.replace('Z', '+00:00')),
-                file_size=payload.size,
-                content_type=payload.content_type,
-                event_metadata=payload.metadata,
-                processed=0
-            )
-            db.add(db_event)
-            db.commit()
-            db.refresh(db_event)
-        
-        # Store in Redis for quick access (optional)
+    if isinstance(payload, LambdaPayload):
+        # Single-record payload: original response shape
+        logger.info(f"Received Lambda webhook for event: {payload.event_id}")
         try:
-            await redis_client.set(
-                f"event:{payload.event_id}",
-                json.dumps({
-                    "bucket": payload.bucket,
-                    "key": payload.key,
-                    "event_name": payload.event_name,
-                    "timestamp": payload.event_time
-                }),
-                expiration=3600  # 1 hour
-            )
-        except Exception as redis_error:
-            logger.warning(f"Redis not available: {redis_error}")
-        
-        # Broadcast initial S3 event notification
-        ws_message = {
-            "type": "s3_upload_detected",
-            "event_id": payload.event_id,
-            "bucket": payload.bucket,
-            "key": payload.key,
-            "event_name": payload.event_name,
-            "timestamp": payload.event_time,
-            "size": payload.size,
-            "content_type": payload.content_type,
-            "data": payload.metadata
-        }
-        await manager.broadcast(ws_message)
-        
-        # Process FL session file if applicable (wait for download to complete)
-        if s3_processor:
-            event_data = {
-                "event_id": payload.event_id,
-                "bucket": payload.bucket,
-                "key": payload.key,
-                "event_name": payload.event_name,
-                "event_time": payload.event_time
-            }
-            # Process synchronously - wait for download and processing to complete
-            await s3_processor.process_s3_event(event_data, db)
-        
-        logger.info(f"Event {payload.event_id} processed and broadcasted")
+            await _handle_lambda_event(payload, db)
+        except Exception as e:
+            logger.error(f"Error processing webhook: {e}")
+            await db.rollback()
+            raise HTTPException(status_code=500, detail=str(e))
         
         return {
             "status": "success",
@@ -226,16 +315,33 @@ async def lambda_webhook(
             "message": "Event received and processing started"
         }
     
-    except Exception as e:
-        logger.error(f"Error processing webhook: {e}")
-        db.rollback()
-        raise HTTPException(status_code=500, detail=str(e))
+    logger.info(f"Received Lambda webhook with {len(payload.batch)} event(s)")
+    
+    # Each record succeeds or fails on its own: earlier records are already
+    # committed and broadcast, and the Lambda does not resend the batch
+    succeeded = []
+    failed = []
+    for record in payload.batch:
+        try:
+            await _handle_lambda_event(record, db)
+            succeeded.append(record.event_id)
+        except Exception as e:
+            logger.error(f"Error processing webhook event {record.event_id}: {e}")
+            await db.rollback()
+            failed.append(record.event_id)
+    
+    return {
+        "status": "success" if not failed else "partial",
+        "event_ids": succeeded,
+        "failed_event_ids": failed,
+        "message": "Events received and processing started"
+    }
 
 
 @app.post("/s3/download")
 async def download_from_s3(
     request: FileDownloadRequest,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Download file content from S3
@@ -244,14 +350,19 @@ async def download_from_s3(
     try:
         logger.info(f"Downloading file from S3: {request.s3_key}")
         
-        # Download file from S3
-        file_content = await s3_client.get_file(request.s3_key)
         file_metadata = await s3_client.get_file_metadata(request.s3_key)
         
         # Store in database if requested
         if request.store_in_db:
+            # Download file from S3
+            file_content = await s3_client.get_file(request.s3_key)
+            # Decode the first 500 bytes straight from a view, no slice copy
+            preview = str(memoryview(file_content)[:500], 'utf-8', 'ignore')
+            
             # Find related event
-            event = db.query(S3Event).filter(S3Event.key == request.s3_key).first()
+            event = (await db.execute(
+                select(S3Event).where(S3Event.key == request.s3_key)
+            )).scalars().first()
             
             db_file = FileContent(
                 event_id=event.event_id if event else None,
@@ -259,15 +370,18 @@ async def download_from_s3(
                 content=file_content.decode('utf-8', errors='ignore'),  # Adjust encoding as needed
             )
             db.add(db_file)
-            db.commit()
+            await db.commit()
+        else:
+            # Only the preview is returned, so read just those bytes
+            preview = (await s3_client.get_file_head(request.s3_key, 500)).decode('utf-8', errors='ignore')
         
         return {
             "status": "success",
             "key": request.s3_key,
-            "size": file_metadata['size'],
-            "content_type": file_metadata['content_type'],
+            "size": file_metadata.size,
+            "content_type": file_metadata.content_type,
             "stored_in_db": request.store_in_db,
-            "content_preview": file_content[:500].decode('utf-8', errors='ignore')  # First 500 bytes
+            "content_preview": preview  # First 500 bytes
         }
     
     except Exception as e:
@@ -298,17 +412,25 @@ async def get_presigned_url(s3_key: str, expiration: int = 3600):
 async def get_events(
     skip: int = 0,
     limit: int = 100,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Get list of S3 events"""
-    events = db.query(S3Event).order_by(S3Event.created_at.desc()).offset(skip).limit(limit).all()
-    return events
+    # Plain rows with just the EventResponse columns (no event_metadata JSON)
+    return (await db.execute(
+        select(
+            S3Event.id, S3Event.event_id, S3Event.bucket, S3Event.key,
+            S3Event.event_name, S3Event.event_time, S3Event.file_size,
+            S3Event.content_type, S3Event.processed, S3Event.created_at
+        ).order_by(S3Event.created_at.desc()).offset(skip).limit(limit)
+    )).all()
 
 
 @app.get("/events/{event_id}", response_model=EventResponse)
-async def get_event(event_id: str, db: Session = Depends(get_db)):
+async def get_event(event_id: str, db: AsyncSession = Depends(get_async_db)):
     """Get specific event by ID"""
-    event = db.query(S3Event).filter(S3Event.event_id == event_id).first()
+    event = (await db.execute(
+        select(S3Event).where(S3Event.event_id == event_id)
+    )).scalars().first()
     if not event:
         raise HTTPException(status_code=404, detail="Event not found")
     return event
@@ -327,7 +449,7 @@ async def websocket_endpoint(websocket: WebSocket):
         await manager.send_personal_message({
             "type": "CONNECTED",
             "message": "Connected to S3 Event Stream",
-            "timestamp": datetime.utcnow().isoformat()
+            "timestamp": _NOW_ISO
         }, websocket)
         
         # Keep connection alive and handle incoming messages
@@ -341,7 +463,7 @@ async def websocket_endpoint(websocket: WebSocket):
                 if message.get("type") == "ping":
                     await manager.send_personal_message({
                         "type": "pong",
-                        "timestamp": datetime.utcnow().isoformat()
+                        "timestamp": _NOW_ISO
                     }, websocket)
             except json.JSONDecodeError:
                 pass
@@ -359,7 +481,7 @@ async def health_check():
     """Health check endpoint"""
     return {
         "status": "healthy",
-        "timestamp": datetime.utcnow().isoformat(),
+        "timestamp": _NOW_ISO,
         "active_websocket_connections": len(manager.active_connections)
     }
 
@@ -388,7 +510,7 @@ async def get_latest_session():
     
     session_id = os.path.basename(latest)
     rounds = fl_watcher.get_session_rounds(session_id)
-    summary = fl_watcher.load_session_summary(session_id)
+    summary = await asyncio.to_thread(fl_watcher.load_session_summary, session_id)
     
     return {
         "sessionId": session_id,
@@ -405,7 +527,7 @@ async def get_session_details(session_id: str):
         raise HTTPException(status_code=503, detail="Session watcher not initialized")
     
     rounds = fl_watcher.get_session_rounds(session_id)
-    summary = fl_watcher.load_session_summary(session_id)
+    summary = await asyncio.to_thread(fl_watcher.load_session_summary, session_id)
     
     if not rounds and not summary:
         raise HTTPException(status_code=404, detail="Session not found")
@@ -425,38 +547,52 @@ async def get_round_data(session_id: str, round_num: int):
         raise HTTPException(status_code=503, detail="Session watcher not initialized")
     
     round_file = f"round_{round_num:03d}.json"
-    data = fl_watcher.load_round_data(session_id, round_file)
-    
-    if not data:
-        raise HTTPException(status_code=404, detail="Round data not found")
+    cache_key = ("fs", session_id, round_file)
+    body = round_responses.get(cache_key)
+    if body is None:
+        data = await asyncio.to_thread(fl_watcher.load_round_data, session_id, round_file)
+        
+        if not data:
+            raise HTTPException(status_code=404, detail="Round data not found")
+        
+        body = round_responses.put(cache_key, data)
     
-    return data
+    return Response(content=body, media_type="application/json")
 
 
 # ==================== Database Query Endpoints ====================
 
 @app.get("/api/db/sessions")
-async def get_db_sessions(db: Session = Depends(get_db)):
+async def get_db_sessions(db: AsyncSession = Depends(get_async_db)):
     """Get all FL sessions from database"""
     try:
         from database import FLSession
-        sessions = db.query(FLSession).order_by(FLSession.created_at.desc()).all()
+        # Column select: plain Row tuples instead of hydrated ORM objects
+        sessions = (await db.execute(
+            select(
+                FLSession.session_id, FLSession.s3_bucket, FLSession.s3_prefix,
+                FLSession.total_rounds, FLSession.start_time, FLSession.end_time,
+                FLSession.status, FLSession.summary, FLSession.created_at,
+                FLSession.updated_at
+            ).order_by(FLSession.created_at.desc())
+        )).all()
         
         return {
             "sessions": [
                 {
-                    "sessionId": s.session_id,
-                    "s3Bucket": s.s3_bucket,
-                    "s3Prefix": s.s3_prefix,
-                    "totalRounds": s.total_rounds,
-                    "startTime": s.start_time.isoformat() if s.start_time else None,
-                    "endTime": s.end_time.isoformat() if s.end_time else None,
-                    "status": s.status,
-                    "summary": s.summary,
-                    "createdAt": s.created_at.isoformat(),
-                    "updatedAt": s.updated_at.isoformat()
+                    "sessionId": session_id,
+                    "s3Bucket": s3_bucket,
+                    "s3Prefix": s3_prefix,
+                    "totalRounds": total_rounds,
+                    "startTime": start_time.isoformat() if start_time else None,
+                    "endTime": end_time.isoformat() if end_time else None,
+                    "status": status,
+                    "summary": summary,
+                    "createdAt": created_at.isoformat(),
+                    "updatedAt": updated_at.isoformat()
                 }
-                for s in sessions
+                for (session_id, s3_bucket, s3_prefix, total_rounds, start_time,
+                     end_time, status, summary, created_at, updated_at) in sessions
             ],
             "count": len(sessions)
         }
@@ -466,18 +602,22 @@ async def get_db_sessions(db: Session = Depends(get_db)):
 
 
 @app.get("/api/db/sessions/{session_id}")
-async def get_db_session_details(session_id: str, db: Session = Depends(get_db)):
+async def get_db_session_details(session_id: str, db: AsyncSession = Depends(get_async_db)):
     """Get FL session details from database including all rounds"""
     try:
         from database import FLSession, FLRound
         
-        session = db.query(FLSession).filter(FLSession.session_id == session_id).first()
+        session = (await db.execute(
+            select(FLSession).where(FLSession.session_id == session_id)
+        )).scalars().first()
         if not session:
             raise HTTPException(status_code=404, detail="Session not found")
         
-        rounds = db.query(FLRound).filter(
-            FLRound.session_id == session_id
-        ).order_by(FLRound.round_number).all()
+        rounds = (await db.execute(
+            select(FLRound).where(
+                FLRound.session_id == session_id
+            ).order_by(FLRound.round_number)
+        )).scalars().all()
         
         return {
             "sessionId": session.session_id,
@@ -512,20 +652,27 @@ async def get_db_session_details(session_id: str, db: Session = Depends(get_db))
 
 
 @app.get("/api/db/sessions/{session_id}/rounds/{round_num}")
-async def get_db_round_data(session_id: str, round_num: int, db: Session = Depends(get_db)):
+async def get_db_round_data(session_id: str, round_num: int, db: AsyncSession = Depends(get_async_db)):
     """Get specific round data from database"""
+    cache_key = ("db", session_id, round_num)
+    body = round_responses.get(cache_key)
+    if body is not None:
+        return Response(content=body, media_type="application/json")
+    
     try:
         from database import FLRound
         
-        round_data = db.query(FLRound).filter(
-            FLRound.session_id == session_id,
-            FLRound.round_number == round_num
-        ).first()
+        round_data = (await db.execute(
+            select(FLRound).where(
+                FLRound.session_id == session_id,
+                FLRound.round_number == round_num
+            )
+        )).scalars().first()
         
         if not round_data:
             raise HTTPException(status_code=404, detail="Round not found")
         
-        return {
+        body = round_responses.put(cache_key, {
             "sessionId": session_id,
             "round": round_data.round_number,
             "accuracy": round_data.accuracy,
@@ -536,7 +683,8 @@ async def get_db_round_data(session_id: str, round_num: int, db: Session = Depen
             "timestamp": round_data.timestamp.isoformat() if round_data.timestamp else None,
             "s3Key": round_data.s3_key,
             "fullData": round_data.round_data
-        }
+        })
+        return Response(content=body, media_type="application/json")
     except HTTPException:
         raise
     except Exception as e:
@@ -545,42 +693,61 @@ async def get_db_round_data(session_id: str, round_num: int, db: Session = Depen
 
 
 @app.get("/api/db/sessions/{session_id}/metrics")
-async def get_session_metrics(session_id: str, db: Session = Depends(get_db)):
+async def get_session_metrics(session_id: str, db: AsyncSession = Depends(get_async_db)):
     """Get aggregated metrics for a session"""
     try:
         from database import FLRound
         
-        rounds = db.query(FLRound).filter(
-            FLRound.session_id == session_id
-        ).order_by(FLRound.round_number).all()
+        # Only the columns the response uses, as plain Row tuples: no ORM
+        # hydration and, above all, no per-row round_data JSON blob
+        rounds = (await db.execute(
+            select(
+                FLRound.round_number,
+                FLRound.accuracy,
+                FLRound.loss,
+                FLRound.malicious_clients,
+                FLRound.timestamp
+            ).where(
+                FLRound.session_id == session_id
+            ).order_by(FLRound.round_number)
+        )).all()
         
         if not rounds:
             raise HTTPException(status_code=404, detail="No rounds found for session")
         
-        # Calculate metrics
-        accuracies = [r.accuracy for r in rounds if r.accuracy is not None]
-        losses = [r.loss for r in rounds if r.loss is not None]
+        # Calculate metrics in a single pass over the rounds
+        accuracies = []
+        losses = []
+        round_entries = []
+        acc_sum = loss_sum = 0.0
+        malicious_sum = 0
+        for r in rounds:
+            if r.accuracy is not None:
+                accuracies.append(r.accuracy)
+                acc_sum += r.accuracy
+            if r.loss is not None:
+                losses.append(r.loss)
+                loss_sum += r.loss
+            malicious_sum += r.malicious_clients or 0
+            round_entries.append({
+                "round": r.round_number,
+                "accuracy": r.accuracy,
+                "loss": r.loss,
+                "maliciousClients": r.malicious_clients,
+                "timestamp": r.timestamp.isoformat() if r.timestamp else None
+            })
         
         return {
             "sessionId": session_id,
             "totalRounds": len(rounds),
             "accuracyTrend": accuracies,
             "lossTrend": losses,
-            "avgAccuracy": sum(accuracies) / len(accuracies) if accuracies else None,
-            "avgLoss": sum(losses) / len(losses) if losses else None,
+            "avgAccuracy": acc_sum / len(accuracies) if accuracies else None,
+            "avgLoss": loss_sum / len(losses) if losses else None,
             "finalAccuracy": accuracies[-1] if accuracies else None,
             "finalLoss": losses[-1] if losses else None,
-            "totalMaliciousDetected": sum(r.malicious_clients or 0 for r in rounds),
-            "rounds": [
-                {
-                    "round": r.round_number,
-                    "accuracy": r.accuracy,
-                    "loss": r.loss,
-                    "maliciousClients": r.malicious_clients,
-                    "timestamp": r.timestamp.isoformat() if r.timestamp else None
-                }
-                for r in rounds
-            ]
+            "totalMaliciousDetected": malicious_sum,
+            "rounds": round_entries
         }
     except HTTPException:
         raise
@@ -593,33 +760,38 @@ async def get_session_metrics(session_id: str, db: Session = Depends(get_db)):
 async def get_s3_events(
     limit: int = 50,
     processed: Optional[int] = None,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Get S3 events from database"""
     try:
         from database import S3Event
         
-        query = db.query(S3Event)
+        query = select(
+            S3Event.event_id, S3Event.bucket, S3Event.key, S3Event.event_name,
+            S3Event.event_time, S3Event.file_size, S3Event.content_type,
+            S3Event.processed, S3Event.created_at
+        )
         
         if processed is not None:
-            query = query.filter(S3Event.processed == processed)
+            query = query.where(S3Event.processed == processed)
         
-        events = query.order_by(S3Event.created_at.desc()).limit(limit).all()
+        events = (await db.execute(query.order_by(S3Event.created_at.desc()).limit(limit))).all()
         
         return {
             "events": [
                 {
-                    "eventId": e.event_id,
-                    "bucket": e.bucket,
-                    "key": e.key,
-                    "eventName": e.event_name,
-                    "eventTime": e.event_time.isoformat() if e.event_time else None,
-                    "fileSize": e.file_size,
-                    "contentType": e.content_type,
-                    "processed": e.processed,
-                    "createdAt": e.created_at.isoformat()
+                    "eventId": event_id,
+                    "bucket": bucket,
+                    "key": key,
+                    "eventName": event_name,
+                    "eventTime": event_time.isoformat() if event_time else None,
+                    "fileSize": file_size,
+                    "contentType": content_type,
+                    "processed": processed_flag,
+                    "createdAt": created_at.isoformat()
                 }
-                for e in events
+                for (event_id, bucket, key, event_name, event_time, file_size,
+                     content_type, processed_flag, created_at) in events
             ],
             "count": len(events)
         }
@@ -628,13 +800,13 @@ async def get_s3_events(
         raise HTTPException(status_code=500, detail=str(e))
 
 
-@app.get("/api/db/sessions")
-async def get_db_sessions(db: Session = Depends(get_db)):
-    """Get all FL sessions stored in database"""
+@app.get("/api/db/files/sessions")
+async def get_db_file_sessions(db: AsyncSession = Depends(get_async_db)):
+    """Get sessions as grouped from the raw files stored in database"""
     if not s3_processor:
         raise HTTPException(status_code=503, detail="S3 processor not initialized")
     
-    sessions = s3_processor.get_stored_sessions(db)
+    sessions = await s3_processor.get_stored_sessions(db)
     return {"sessions": sessions, "count": len(sessions)}
 
 
@@ -642,12 +814,14 @@ async def get_db_sessions(db: Session = Depends(get_db)):
 async def get_db_files(
     limit: int = 50,
     offset: int = 0,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Get all files stored in database"""
-    files = db.query(FileContent).order_by(
-        FileContent.stored_at.desc()
-    ).offset(offset).limit(limit).all()
+    files = (await db.execute(
+        select(FileContent).order_by(
+            FileContent.stored_at.desc()
+        ).offset(offset).limit(limit)
+    )).scalars().all()
     
     return {
         "files": [
@@ -665,11 +839,11 @@ async def get_db_files(
 
 
 @app.get("/api/db/file/{event_id}")
-async def get_file_content(event_id: str, db: Session = Depends(get_db)):
+async def get_file_content(event_id: str, db: AsyncSession = Depends(get_async_db)):
     """Get file content from database by event ID"""
-    file_record = db.query(FileContent).filter(
-        FileContent.event_id == event_id
-    ).first()
+    file_record = (await db.execute(
+        select(FileContent).where(FileContent.event_id == event_id)
+    )).scalars().first()
     
     if not file_record:
         raise HTTPException(status_code=404, detail="File not found in database")
@@ -692,13 +866,15 @@ async def get_file_content(event_id: str, db: Session = Depends(get_db)):
 
 
 @app.post("/api/s3/process/{event_id}")
-async def manually_process_s3_file(event_id: str, db: Session = Depends(get_db)):
+async def manually_process_s3_file(event_id: str, db: AsyncSession = Depends(get_async_db)):
     """Manually trigger processing of an S3 file"""
     if not s3_processor:
         raise HTTPException(status_code=503, detail="S3 processor not initialized")
     
     # Get event from database
-    event = db.query(S3Event).filter(S3Event.event_id == event_id).first()
+    event = (await db.execute(
+        select(S3Event).where(S3Event.event_id == event_id)
+    )).scalars().first()
     if not event:
         raise HTTPException(status_code=404, detail="Event not found")
     
@@ -724,13 +900,11 @@ async def manually_process_s3_file(event_id: str, db: Session = Depends(get_db))
 # ============================================================================
 
 @app.get("/api/metrics/global")
-async def get_global_metrics(db: Session = Depends(get_db)):
+async def get_global_metrics(db: AsyncSession = Depends(get_async_db)):
     """Get global model metrics from latest round."""
     try:
         # Get latest session
-        latest_session = db.query(FileContent).filter(
-            FileContent.s3_key.like("%summary.json")
-        ).order_by(FileContent.stored_at.desc()).first()
+        latest_session = await _latest_summary_file(db)
         
         if not latest_session:
             return {"success": False, "error": "No active simulation"}
@@ -743,7 +917,7 @@ async def get_global_metrics(db: Session = Depends(get_db)):
         
         # Get latest round
         latest_round = round_history[-1]
-        metrics = transform_to_global_metrics(latest_round)
+        metrics = cached_global_metrics(latest_session.s3_key, latest_round)
         
         return {"success": True, "data": metrics}
     except Exception as e:
@@ -755,16 +929,14 @@ async def get_global_metrics(db: Session = Depends(get_db)):
 async def get_training_rounds(
     limit: Optional[int] = None,
     offset: int = 0,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Get training round history."""
     try:
-        latest_session = db.query(FileContent).filter(
-            FileContent.s3_key.like("%summary.json")
-        ).order_by(FileContent.stored_at.desc()).first()
+        latest_session = await _latest_summary_file(db)
         
         if not latest_session:
-            return {"success": True, "data": {"rounds": [], "total": 0, "timestamp": datetime.utcnow().isoformat() + "Z"}}
+            return {"success": True, "data": {"rounds": [], "total": 0, "timestamp": _NOW_ISO_Z}}
         
         summary = json.loads(latest_session.content)
         round_history = summary.get("roundHistory", [])
@@ -777,9 +949,7 @@ async def get_training_rounds(
             
             accuracy = round_summary.get("accuracy") or global_metrics.get("accuracy")
             if accuracy is None:
-                clients = round_data.get("clients", [])
-                active = [c for c in clients if c.get("accuracy") is not None]
-                accuracy = sum(c["accuracy"] for c in active) / len(active) if active else 0.0
+                accuracy = mean_client_accuracy(round_data.get("clients", []))
             
             rounds.append({
                 "round": metadata.get("round", 0),
@@ -803,7 +973,7 @@ async def get_training_rounds(
                 "total": total,
                 "limit": limit,
                 "offset": offset,
-                "timestamp": datetime.utcnow().isoformat() + "Z"
+                "timestamp": _NOW_ISO_Z
             }
         }
     except Exception as e:
@@ -815,22 +985,20 @@ async def get_training_rounds(
 async def get_clients(
     type: Optional[str] = None,
     status: Optional[str] = None,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Get all clients with optional filtering."""
     try:
-        latest_session = db.query(FileContent).filter(
-            FileContent.s3_key.like("%summary.json")
-        ).order_by(FileContent.stored_at.desc()).first()
+        latest_session = await _latest_summary_file(db)
         
         if not latest_session:
-            return {"success": True, "data": {"clients": [], "total": 0, "timestamp": datetime.utcnow().isoformat() + "Z"}}
+            return {"success": True, "data": {"clients": [], "total": 0, "timestamp": _NOW_ISO_Z}}
         
         summary = json.loads(latest_session.content)
         round_history = summary.get("roundHistory", [])
         
         if not round_history:
-            return {"success": True, "data": {"clients": [], "total": 0, "timestamp": datetime.utcnow().isoformat() + "Z"}}
+            return {"success": True, "data": {"clients": [], "total": 0, "timestamp": _NOW_ISO_Z}}
         
         # Get latest round's clients
         latest_round = round_history[-1]
@@ -872,7 +1040,7 @@ async def get_clients(
             "data": {
                 "clients": formatted_clients,
                 "total": len(formatted_clients),
-                "timestamp": datetime.utcnow().isoformat() + "Z"
+                "timestamp": _NOW_ISO_Z
             }
         }
     except Exception as e:
@@ -885,16 +1053,14 @@ async def get_alerts(
     severity: Optional[str] = None,
     type: Optional[str] = None,
     limit: int = 50,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Get security alerts."""
     try:
-        latest_session = db.query(FileContent).filter(
-            FileContent.s3_key.like("%summary.json")
-        ).order_by(FileContent.stored_at.desc()).first()
+        latest_session = await _latest_summary_file(db)
         
         if not latest_session:
-            return {"success": True, "data": {"alerts": [], "total": 0, "timestamp": datetime.utcnow().isoformat() + "Z"}}
+            return {"success": True, "data": {"alerts": [], "total": 0, "timestamp": _NOW_ISO_Z}}
         
         summary = json.loads(latest_session.content)
         round_history = summary.get("roundHistory", [])
@@ -928,7 +1094,7 @@ async def get_alerts(
             "data": {
                 "alerts": all_alerts,
                 "total": len(all_alerts),
-                "timestamp": datetime.utcnow().isoformat() + "Z"
+                "timestamp": _NOW_ISO_Z
             }
         }
     except Exception as e:
@@ -937,12 +1103,10 @@ async def get_alerts(
 
 
 @app.get("/api/defense/metrics")
-async def get_defense_metrics(db: Session = Depends(get_db)):
+async def get_defense_metrics(db: AsyncSession = Depends(get_async_db)):
     """Get defense system metrics."""
     try:
-        latest_session = db.query(FileContent).filter(
-            FileContent.s3_key.like("%summary.json")
-        ).order_by(FileContent.stored_at.desc()).first()
+        latest_session = await _latest_summary_file(db)
         
         if not latest_session:
             return {"success": False, "error": "No active simulation"}
@@ -995,7 +1159,7 @@ async def get_defense_metrics(db: Session = Depends(get_db)):
                     "trueNegative": confusion_matrix.get("trueNegative", 0),
                     "falseNegative": confusion_matrix.get("falseNegative", 0)
                 },
-                "timestamp": latest_round.get("metadata", {}).get("timestamp", datetime.utcnow().isoformat() + "Z")
+                "timestamp": latest_round.get("metadata", {}).get("timestamp", _NOW_ISO_Z)
             }
         }
     except Exception as e:
@@ -1008,16 +1172,14 @@ async def get_logs(
     level: Optional[str] = None,
     limit: int = 100,
     since: Optional[str] = None,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Get system logs."""
     try:
-        latest_session = db.query(FileContent).filter(
-            FileContent.s3_key.like("%summary.json")
-        ).order_by(FileContent.stored_at.desc()).first()
+        latest_session = await _latest_summary_file(db)
         
         if not latest_session:
-            return {"success": True, "data": {"logs": [], "total": 0, "timestamp": datetime.utcnow().isoformat() + "Z"}}
+            return {"success": True, "data": {"logs": [], "total": 0, "timestamp": _NOW_ISO_Z}}
         
         summary = json.loads(latest_session.content)
         round_history = summary.get("roundHistory", [])
@@ -1083,7 +1245,7 @@ async def get_logs(
             "data": {
                 "logs": logs,
                 "total": len(logs),
-                "timestamp": datetime.utcnow().isoformat() + "Z"
+                "timestamp": _NOW_ISO_Z
             }
         }
     except Exception as e:
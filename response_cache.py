@@ -0,0 +1,51 @@
+"""
+Serialized JSON bodies for immutable FL rounds
+
+A round doesn't change once written, so the round endpoints keep the
+encoded response and skip both the load and the encode on a hit. Writers
+(the S3 processor and the session watcher) invalidate a round's entry when
+they overwrite it.
+"""
+
+import threading
+from collections import OrderedDict
+from typing import Any, Hashable, Optional
+
+import json_utils
+
+ROUND_CACHE_SIZE = 256
+
+
+class ResponseCache:
+    """LRU of JSON-encoded bodies; safe to invalidate from watcher threads"""
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._entries: "OrderedDict[Hashable, bytes]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Optional[bytes]:
+        with self._lock:
+            body = self._entries.get(key)
+            if body is not None:
+                self._entries.move_to_end(key)
+            return body
+
+    def put(self, key: Hashable, obj: Any) -> bytes:
+        """Encode obj, cache the bytes under key and return them"""
+        body = json_utils.dumps(obj)
+        with self._lock:
+            self._entries[key] = body
+            self._entries.move_to_end(key)
+            if len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+        return body
+
+    def invalidate(self, key: Hashable):
+        with self._lock:
+            self._entries.pop(key, None)
+
+
+# Keys: ("db", session_id, round_number) for the database round endpoint,
+# ("fs", session_id, round_file) for the session-directory one
+round_responses = ResponseCache(ROUND_CACHE_SIZE)
@@ -11,12 +11,26 @@ from pathlib import Path
 from datetime import datetime
 from typing import Optional, Dict, Any
 import asyncio
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 
+import json_utils
+from response_cache import round_responses
 from aws_client import s3_client
 from database import S3Event, FileContent, FLSession, FLRound, SessionLocal
 from websocket_manager import ConnectionManager
 
+_aioboto3_session = None
+
+
+def _get_aioboto3_session():
+    """Get the process-wide aioboto3 session, creating it on first use"""
+    global _aioboto3_session
+    if _aioboto3_session is None:
+        import aioboto3
+        _aioboto3_session = aioboto3.Session()
+    return _aioboto3_session
+
 
 class S3FLFileProcessor:
     """Processes FL session files from S3"""
@@ -26,7 +40,7 @@ class S3FLFileProcessor:
         self.local_sessions_path = Path(local_sessions_path)
         self.local_sessions_path.mkdir(parents=True, exist_ok=True)
     
-    async def process_s3_event(self, event_data: Dict[str, Any], db: Session):
+    async def process_s3_event(self, event_data: Dict[str, Any], db: AsyncSession):
         """
         Process S3 event: download file, store in DB, save locally, and broadcast
         """
@@ -55,7 +69,7 @@ class S3FLFileProcessor:
             else:
                 # JSON file
                 try:
-                    json_data = json.loads(file_content)
+                    json_data = json_utils.loads(file_content)
                 except json.JSONDecodeError as e:
                     print(f"❌ Invalid JSON in {key}: {e}")
                     return
@@ -78,10 +92,12 @@ class S3FLFileProcessor:
                 await self._broadcast_session_summary(json_data)
             
             # Mark as processed
-            event = db.query(S3Event).filter(S3Event.event_id == event_id).first()
+            event = (await db.execute(
+                select(S3Event).where(S3Event.event_id == event_id)
+            )).scalars().first()
             if event:
                 event.processed = 1
-                db.commit()
+                await db.commit()
             
             print(f"✅ Successfully processed: {key}")
             print(f"   Stored in DB and saved to: {local_path}")
@@ -104,8 +120,7 @@ class S3FLFileProcessor:
     async def _download_from_s3(self, bucket: str, key: str) -> Optional[str]:
         """Download file content from S3 (handles gzip compression)"""
         try:
-            response = s3_client.s3_client.get_object(Bucket=bucket, Key=key)
-            content_bytes = response['Body'].read()
+            content_bytes = await s3_client.get_file(key, bucket=bucket)
             
             # Check if content is gzip-compressed (starts with 0x1f8b)
             if content_bytes[:2] == b'\x1f\x8b':
@@ -119,16 +134,16 @@ class S3FLFileProcessor:
             print(f"Error downloading from S3: {e}")
             return None
     
-    async def _store_in_database(self, event_id: str, s3_key: str, content: str, json_data: Dict[str, Any], db: Session):
+    async def _store_in_database(self, event_id: str, s3_key: str, content: str, json_data: Dict[str, Any], db: AsyncSession):
         """Store file content in SQLite database"""
         try:
             # Calculate content hash
             content_hash = hashlib.sha256(content.encode()).hexdigest()
             
             # Store raw file content
-            existing = db.query(FileContent).filter(
-                FileContent.event_id == event_id
-            ).first()
+            existing = (await db.execute(
+                select(FileContent).where(FileContent.event_id == event_id)
+            )).scalars().first()
             
             if existing:
                 print(f"📝 Updating existing DB record for: {s3_key}")
@@ -147,14 +162,15 @@ class S3FLFileProcessor:
                 db.add(file_record)
             
             # Store FL-specific data
+            stored_round = None
             metadata = json_data.get('metadata', {})
             session_id = metadata.get('sessionId')
             
             if session_id:
                 # Store/update FL session
-                session = db.query(FLSession).filter(
-                    FLSession.session_id == session_id
-                ).first()
+                session = (await db.execute(
+                    select(FLSession).where(FLSession.session_id == session_id)
+                )).scalars().first()
                 
                 if not session:
                     session = FLSession(
@@ -173,10 +189,12 @@ class S3FLFileProcessor:
                 if 'round_' in s3_key:
                     round_num = metadata.get('round')
                     if round_num:
-                        existing_round = db.query(FLRound).filter(
-                            FLRound.session_id == session_id,
-                            FLRound.round_number == round_num
-                        ).first()
+                        existing_round = (await db.execute(
+                            select(FLRound).where(
+                                FLRound.session_id == session_id,
+                                FLRound.round_number == round_num
+                            )
+                        )).scalars().first()
                         
                         global_metrics = json_data.get('globalMetrics', {})
                         
@@ -204,6 +222,8 @@ class S3FLFileProcessor:
                             )
                             db.add(fl_round)
                         
+                        stored_round = (session_id, round_num)
+                        
                         # Update session total rounds
                         if round_num > (session.total_rounds or 0):
                             session.total_rounds = round_num
@@ -216,14 +236,17 @@ class S3FLFileProcessor:
                     if json_data.get('endTime'):
                         session.end_time = datetime.fromisoformat(json_data['endTime'].replace('Z', '+00:00'))
             
-            db.commit()
+            await db.commit()
+            if stored_round:
+                # Committed: the next request re-reads the overwritten round
+                round_responses.invalidate(("db", *stored_round))
             print(f"✅ Stored in database: {s3_key} (hash: {content_hash[:12]}...)")
             
         except Exception as e:
             print(f"Error storing in database: {e}")
             import traceback
             traceback.print_exc()
-            db.rollback()
+            await db.rollback()
     
     async def _save_locally(self, s3_key: str, content: str, json_data: Optional[Dict[str, Any]]) -> Path:
         """Save file to local sessions directory"""
@@ -326,10 +349,15 @@ class S3FLFileProcessor:
         except Exception as e:
             print(f"Error broadcasting SHAP analysis: {e}")
     
-    def get_stored_sessions(self, db: Session) -> list:
+    async def get_stored_sessions(self, db: AsyncSession) -> list:
         """Get all sessions stored in database"""
         try:
-            files = db.query(FileContent).order_by(FileContent.stored_at.desc()).all()
+            # Only the key and timestamp are needed, not the stored content
+            files = (await db.execute(
+                select(FileContent.s3_key, FileContent.stored_at).order_by(
+                    FileContent.stored_at.desc()
+                )
+            )).all()
             
             sessions = {}
             for file in files:
@@ -353,15 +381,15 @@ class S3FLFileProcessor:
             print(f"Error getting stored sessions: {e}")
             return []
     
-    def get_round_from_db(self, event_id: str, db: Session) -> Optional[Dict[str, Any]]:
+    async def get_round_from_db(self, event_id: str, db: AsyncSession) -> Optional[Dict[str, Any]]:
         """Retrieve round data from database"""
         try:
-            file_record = db.query(FileContent).filter(
-                FileContent.event_id == event_id
-            ).first()
+            file_record = (await db.execute(
+                select(FileContent).where(FileContent.event_id == event_id)
+            )).scalars().first()
             
             if file_record and file_record.content:
-                return json.loads(file_record.content)
+                return json_utils.loads(file_record.content)
             return None
             
         except Exception as e:
@@ -386,14 +414,12 @@ class S3FLFileProcessor:
             Dictionary with path to downloaded CSV file, or None if failed
         """
         try:
-            import aioboto3
-            
             print(f"📥 Starting SHAP analysis CSV download for session: {session_id}")
             
             session_dir = self.local_sessions_path / session_id
             session_dir.mkdir(parents=True, exist_ok=True)
             
-            session = aioboto3.Session()
+            session = _get_aioboto3_session()
             async with session.client('s3', region_name=s3_region) as s3:
                 # Download shap_analysis.csv from session folder
                 s3_key = f"sessions/{session_id}/shap_analysis.csv"
@@ -1,18 +1,28 @@
 from pydantic import BaseModel, Field
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, List
 from datetime import datetime
 
 
-class LambdaPayload(BaseModel):
-    """Payload sent from Lambda to FastAPI"""
+class LambdaEventRecord(BaseModel):
+    """One S3 record forwarded by Lambda"""
     event_id: str
     bucket: str
     key: str
     event_name: str
-    event_time: str
+    event_time: datetime  # ISO 8601 from S3 (trailing "Z"), parsed during validation
     size: Optional[int] = None
     content_type: Optional[str] = None
     metadata: Optional[Dict[str, Any]] = None
+
+
+class LambdaPayload(LambdaEventRecord):
+    """Single-record payload sent from Lambda to FastAPI"""
+    secret_key: str  # For authentication
+
+
+class LambdaBatchPayload(BaseModel):
+    """All records of one S3 notification, sent from Lambda in a single POST"""
+    batch: List[LambdaEventRecord]
     secret_key: str  # For authentication
 
 
@@ -1,8 +1,10 @@
 from fastapi import WebSocket
 from typing import List, Dict
-import json
+import asyncio
 import logging
 
+import json_utils
+
 logger = logging.getLogger(__name__)
 
 
@@ -39,32 +41,42 @@ class ConnectionManager:
         except Exception as e:
             logger.error(f"Error sending personal message: {e}")
     
-    async def broadcast(self, message: dict, room: str = "default"):
-        """Broadcast message to all clients in a room"""
+    async def _send_text_all(self, connections: List[WebSocket], text: str) -> List[WebSocket]:
+        """Send one pre-serialized frame to every connection concurrently; return the failed ones"""
+        # Snapshot: connections may join or leave while sends are awaited
+        connections = list(connections)
+        results = await asyncio.gather(
+            *(connection.send_text(text) for connection in connections),
+            return_exceptions=True
+        )
+        disconnected = []
+        for connection, result in zip(connections, results):
+            if isinstance(result, Exception):
+                logger.error(f"Error broadcasting to client: {result}")
+                disconnected.append(connection)
+        return disconnected
+    
+    async def broadcast_text(self, text: str, room: str = "default"):
+        """Broadcast an already serialized JSON message to all clients in a room"""
         if room not in self.room_connections:
             return
         
-        disconnected = []
-        for connection in self.room_connections[room]:
-            try:
-                await connection.send_json(message)
-            except Exception as e:
-                logger.error(f"Error broadcasting to client: {e}")
-                disconnected.append(connection)
+        disconnected = await self._send_text_all(self.room_connections[room], text)
         
         # Clean up disconnected clients
         for connection in disconnected:
             self.disconnect(connection, room)
     
+    async def broadcast(self, message: dict, room: str = "default"):
+        """Broadcast message to all clients in a room"""
+        # Serialize once for the whole room rather than per connection
+        await self.broadcast_text(json_utils.dumps_text(message), room)
+    
     async def broadcast_all(self, message: dict):
         """Broadcast to all connected clients"""
-        disconnected = []
-        for connection in self.active_connections:
-            try:
-                await connection.send_json(message)
-            except Exception as e:
-                logger.error(f"Error broadcasting to client: {e}")
-                disconnected.append(connection)
+        disconnected = await self._send_text_all(
+            self.active_connections, json_utils.dumps_text(message)
+        )
         
         # Clean up disconnected clients
         for connection in disconnected: